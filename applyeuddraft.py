@@ -30,8 +30,10 @@ import traceback
 
 import eudplib as ep
 
+import buildevent
 import freezeMpq
 import msgbox
+import payloadstats
 import scbank_core
 from freeze import decryptOffsets, encryptOffsets, obfpatch, obfunpatch, unFreeze
 from msgbox import MB_ICONHAND, MB_OK, MessageBeep, MessageBox
@@ -44,7 +46,153 @@ from pluginLoader import (
 from readconfig import readconfig
 
 
-def createPayloadMain(pluginList, pluginFuncDict):
+def createWatchdog(frameBudget, recoveryFrames):
+    """Per-frame watchdog. Returns (update function, shedFrames variable).
+
+    System time dword at 0x51CE8C counts down in milliseconds. Frames longer
+    than frameBudget ms start shedding, which lasts until recoveryFrames
+    frames in a row stay within the budget. This is the wall time between
+    two frames, so game speed, lag and rendering count too, not only
+    triggers. It differs between players, so shed hooks must not touch
+    synced state.
+    """
+    lastTick, shedFrames = ep.EUDVariable(), ep.EUDVariable()
+    lastTick << ep.f_dwread_epd(ep.EPD(0x51CE8C))
+
+    def updateWatchdog():
+        tick = ep.f_dwread_epd(ep.EPD(0x51CE8C))
+        elapsed = lastTick - tick
+        lastTick << tick
+        if ep.EUDIf()(elapsed >= frameBudget):
+            shedFrames << recoveryFrames
+        if ep.EUDElseIf()(shedFrames >= 1):
+            shedFrames -= 1
+        ep.EUDEndIf()
+
+    return updateWatchdog, shedFrames
+
+
+# Built-in events of eventHooks. Each is a list of (address, mask) to watch.
+builtinEvents = {
+    "chat": [(0x640B58, 0xFFFFFFFF)],  # Index of the latest chat line
+    "mouse": [(0x6CDDC0, 0xFFFFFFFF)],  # Mouse button state
+    "keyboard": [(0x596A18 + 4 * i, 0xFFFFFFFF) for i in range(64)],
+    # Trigger list of each player, emptied when the player leaves. This is
+    # what f_playerexist reads.
+    "players": [(0x51A280 + 12 * p + 8, 0xFFFFFFFF) for p in range(8)],
+}
+
+
+def getEventWatches(pluginName, event):
+    """Normalize event key of eventHooks to a list of (address, mask)"""
+    if isinstance(event, str):
+        try:
+            return builtinEvents[event]
+        except KeyError:
+            raise RuntimeError(
+                'Unknown event "%s" of plugin %s. Use one of %s or (address, mask)'
+                % (event, pluginName, ", ".join(builtinEvents))
+            )
+    if isinstance(event, int):
+        event = (event, 0xFFFFFFFF)
+    addr, mask = event
+    if addr % 4:
+        raise RuntimeError(
+            "Event address 0x%X of plugin %s is not dword aligned" % (addr, pluginName)
+        )
+    return [(addr, mask)]
+
+
+def getEventName(event):
+    if isinstance(event, str):
+        return event
+    if isinstance(event, int):
+        return "0x%X" % event
+    return "0x%X/0x%X" % tuple(event)
+
+
+def createEventDetectors(events):
+    """Shared change detectors of eventHooks. Returns (update function, flags).
+
+    events is a list of watch lists. After the update function runs,
+    flags[i] is 1 if any watched value of events[i] changed since last frame.
+    Every (address, mask) is compared once per frame however many hooks
+    watch it, and values watched by the same events are compared 16 per
+    trigger. Changed values are stored into the compare conditions, so
+    detection costs a few triggers on frames where nothing happens.
+    """
+    watchers = {}  # (address, mask) -> indexes of events
+    for index, watches in enumerate(events):
+        for watch in watches:
+            watchers.setdefault(watch, set()).add(index)
+    groups = {}  # indexes of events -> watches
+    for watch, indexes in watchers.items():
+        groups.setdefault(frozenset(indexes), []).append(watch)
+
+    flags = [ep.EUDVariable() for _ in events]
+    chunks = []  # (flags to raise, [(address, mask, compare condition)])
+    for indexes, watches in groups.items():
+        for i in range(0, len(watches), 16):
+            chunk = [(addr, mask, ep.Forward()) for addr, mask in watches[i : i + 16]]
+            chunks.append(([flags[index] for index in sorted(indexes)], chunk))
+
+    def snapshot(chunk):
+        for addr, mask, cmp in chunk:
+            value = ep.f_dwread_epd(ep.EPD(addr))
+            if mask != 0xFFFFFFFF:
+                value = value & mask
+            ep.f_dwwrite_epd(ep.EPD(cmp) + 2, value)
+
+    # Hooks run on changes after the game starts, not on the initial state.
+    for _, chunk in chunks:
+        snapshot(chunk)
+
+    changed = ep.EUDVariable()
+
+    def updateDetectors():
+        ep.DoActions([flag.SetNumber(0) for flag in flags])
+        for chunkFlags, chunk in chunks:
+            changed << 1
+            ep.RawTrigger(
+                conditions=[
+                    cmp << ep.MemoryX(addr, ep.Exactly, 0, mask)
+                    for addr, mask, cmp in chunk
+                ],
+                actions=changed.SetNumber(0),
+            )
+            if ep.EUDIf()(changed == 1):
+                snapshot(chunk)
+                ep.DoActions([flag.SetNumber(1) for flag in chunkFlags])
+            ep.EUDEndIf()
+
+    return updateDetectors, flags
+
+
+def createPayloadMain(
+    pluginList, pluginFuncDict, lowPriority=(), frameBudget=84, recoveryFrames=24
+):
+    events = []  # Distinct watch lists
+    eventHooks = []  # (pluginName, hookName, hook, index of event)
+    for pluginName in pluginList:
+        for event, hook in pluginFuncDict[pluginName][3].items():
+            watches = getEventWatches(pluginName, event)
+            if watches not in events:
+                events.append(watches)
+            hookName = "event:%s" % getEventName(event)
+            eventHooks.append((pluginName, hookName, hook, events.index(watches)))
+
+    def runHook(pluginName, hook, hookName, shedFrames, conditions=(), shed=True):
+        conditions = list(conditions)
+        if shed and pluginName in lowPriority:
+            conditions.append(shedFrames == 0)
+        with payloadstats.countTriggers(pluginName, hookName):
+            if conditions:
+                if ep.EUDIf()(conditions):
+                    hook()
+                ep.EUDEndIf()
+            else:
+                hook()
+
     @ep.EUDFunc
     def payloadMain():
         """Main function of euddraft payload."""
@@ -58,7 +206,15 @@ def createPayloadMain(pluginList, pluginFuncDict):
 
         for pluginName in pluginList:
             onPluginStart = pluginFuncDict[pluginName][0]
-            onPluginStart()
+            with payloadstats.countTriggers(pluginName, "onPluginStart"):
+                onPluginStart()
+
+        shedFrames = None
+        if lowPriority:
+            updateWatchdog, shedFrames = createWatchdog(frameBudget, recoveryFrames)
+
+        if eventHooks:
+            updateDetectors, eventFlags = createEventDetectors(events)
 
         # Do trigger loop
         if ep.EUDInfLoop()():
@@ -66,18 +222,30 @@ def createPayloadMain(pluginList, pluginFuncDict):
                 decryptOffsets()
                 obfpatch()
 
+            if lowPriority:
+                updateWatchdog()
+
             if isSCBankIssued():
                 scbank_core.beforeTriggerExec()
 
+            if eventHooks:
+                updateDetectors()
+                # Event hooks are never shed. Their flags only last for this
+                # frame, so a skipped hook would lose the event for good.
+                for pluginName, hookName, hook, index in eventHooks:
+                    flag = eventFlags[index]
+                    conditions = [flag == 1]
+                    runHook(pluginName, hook, hookName, shedFrames, conditions, False)
+
             for pluginName in pluginList:
-                beforeTriggerExec = pluginFuncDict[pluginName][1]
-                beforeTriggerExec()
+                hook = pluginFuncDict[pluginName][1]
+                runHook(pluginName, hook, "beforeTriggerExec", shedFrames)
 
             ep.RunTrigTrigger()
 
             for pluginName in reversed(pluginList):
-                afterTriggerExec = pluginFuncDict[pluginName][2]
-                afterTriggerExec()
+                hook = pluginFuncDict[pluginName][2]
+                runHook(pluginName, hook, "afterTriggerExec", shedFrames)
 
             if isSCBankIssued():
                 scbank_core.afterTriggerExec()
@@ -121,11 +289,105 @@ def isEpExc(s):
     )
 
 
+def getExcFrames(exc_type, exc_value, exc_traceback):
+    """Get chained exceptions with eudplib/euddraft internal frames filtered.
+
+    Returns list of {'type', 'message', 'frames', 'isCause'}, outermost
+    exception last. 'isCause' tells whether the exception was raised from
+    the previous one. Each frame is {'filename', 'lineno', 'name', 'line'}.
+    """
+    chain = []
+    te = traceback.TracebackException(exc_type, exc_value, exc_traceback)
+    while te is not None:
+        if te.__cause__ is not None:
+            chain.append((te, True))
+            te = te.__cause__
+        elif not te.__suppress_context__:
+            chain.append((te, False))
+            te = te.__context__
+        else:
+            chain.append((te, False))
+            te = None
+
+    excs = []
+    for te, isCause in reversed(chain):
+        stack = list(te.stack)
+        isEp = [isEpExc(s) for s in traceback.format_list(stack)]
+        frames = []
+        for i, frame in enumerate(stack):
+            # Keep internal frames only when no user frame follows them
+            if isEp[i] and not all(isEp[i + 1 :]):
+                continue
+            frames.append(
+                {
+                    "filename": frame.filename,
+                    "lineno": frame.lineno,
+                    "name": frame.name,
+                    "line": frame.line,
+                }
+            )
+        excs.append(
+            {
+                "type": te.exc_type.__name__,
+                "message": str(te),
+                "frames": frames,
+                "isCause": isCause,
+            }
+        )
+    return excs
+
+
+def formatExcFrames(excs):
+    lines = []
+    for i, exc in enumerate(excs):
+        if i and exc["isCause"]:
+            lines.append(
+                "\nThe above exception was the direct cause "
+                "of the following exception:\n\n"
+            )
+        elif i:
+            lines.append(
+                "\nDuring handling of the above exception, "
+                "another exception occurred:\n\n"
+            )
+        if exc["frames"]:
+            lines.append("Traceback (most recent call last):\n")
+        for frame in exc["frames"]:
+            lines.append(
+                '  File "%s", line %s, in %s\n'
+                % (frame["filename"], frame["lineno"], frame["name"])
+            )
+            if frame["line"]:
+                lines.append("    %s\n" % frame["line"])
+        if exc["message"]:
+            lines.append("%s: %s\n" % (exc["type"], exc["message"]))
+        else:
+            lines.append("%s\n" % exc["type"])
+    return "".join(lines)
+
+
 ##############################
 
 
 def applyEUDDraft(sfname):
     try:
+        with buildevent.captureWarnings():
+            return _applyEUDDraft(sfname)
+
+    except Exception as e:
+        print("==========================================")
+        MessageBeep(MB_ICONHAND)
+        excs = getExcFrames(*sys.exc_info())
+        buildevent.emit("error", message=str(e), exceptions=excs)
+
+        print("[Error] %s" % e, formatExcFrames(excs), file=sys.stderr)
+        if msgbox.isWindows:
+            msgbox.SetForegroundWindow(msgbox.GetConsoleWindow())
+        return False
+
+
+def _applyEUDDraft(sfname):
+    with buildevent.stage("config"):
         config = readconfig(sfname)
         mainSection = config["main"]
         ifname = mainSection["input"]
@@ -154,6 +416,25 @@ def applyEUDDraft(sfname):
         except KeyError:
             pass
 
+        # [main]
+        # lowPriority: plugins which only touch local state (camera, sound,
+        #   UI). Their per-frame hooks are skipped on slow frames. Frame time
+        #   differs between players, so a plugin changing game state here
+        #   desyncs the game.
+        # frameBudget: ms between two frames, measured with the system time.
+        #   This is frame-to-frame wall time of the whole game, not the
+        #   trigger cost of the plugins.
+        # recoveryFrames: frames within the budget before hooks run again
+        lowPriority = [
+            name.strip()
+            for name in mainSection.get("lowPriority", "").split(",")
+            if name.strip()
+        ]
+        frameBudget = int(mainSection.get("frameBudget", "84"), 0)
+        recoveryFrames = int(mainSection.get("recoveryFrames", "24"), 0)
+
+        deadTriggerReport = mainSection.get("deadTriggerReport", "").lower() == "true"
+
         sectorSize = 15
         try:
             if mainSection["sectorSize"]:
@@ -163,64 +444,64 @@ def applyEUDDraft(sfname):
         except:
             sectorSize = None
 
-        print("---------- Loading plugins... ----------")
+    print("---------- Loading plugins... ----------")
+    with buildevent.stage("loadMap"):
         ep.LoadMap(ifname)
+    with buildevent.stage("loadPlugins"):
         pluginList, pluginFuncDict = loadPluginsFromConfig(ep, config)
 
-        print("--------- Injecting plugins... ---------")
-
-        payloadMain = createPayloadMain(pluginList, pluginFuncDict)
+    print("--------- Injecting plugins... ---------")
+
+    for pluginName in lowPriority:
+        if pluginName not in pluginList:
+            raise RuntimeError("lowPriority plugin %s is not loaded" % pluginName)
+    if lowPriority:
+        print(
+            "[watchdog] %s skip frames while a frame takes over %d ms.\n"
+            "  The budget is wall time between frames, not their trigger cost.\n"
+            "  Their hooks must only touch local state (camera, sound, UI),\n"
+            "  since frame time differs between players and would desync them."
+            % (", ".join(lowPriority), frameBudget)
+        )
+
+    with buildevent.stage("injectPlugins"):
+        payloadMain = createPayloadMain(
+            pluginList, pluginFuncDict, lowPriority, frameBudget, recoveryFrames
+        )
         ep.CompressPayload(True)
 
-        if ep.IsSCDBMap():
-            if isFreezeIssued():
-                raise RuntimeError(
-                    "Can't use freeze protection on SCDB map!\nDisable freeze by following plugin settings:\n\n[freeze]\nfreeze : 0\n"
-                )
-            print("SCDB - sectorSize disabled")
-            sectorSize = None
-        elif isFreezeIssued():
-            # FIXME: Add variable sectorSize support for freeze
-            print("Freeze - sectorSize disabled")
-            sectorSize = None
-        ep.SaveMap(ofname, payloadMain, sectorSize=sectorSize)
-
+    if ep.IsSCDBMap():
         if isFreezeIssued():
-            if isPromptIssued():
-                print("Freeze - prompt enabled ")
-                sys.stdout.flush()
-                os.system("pause")
-            print("[Stage 4/3] Applying freeze mpq modification...")
+            raise RuntimeError(
+                "Can't use freeze protection on SCDB map!\nDisable freeze by following plugin settings:\n\n[freeze]\nfreeze : 0\n"
+            )
+        print("SCDB - sectorSize disabled")
+        sectorSize = None
+    elif isFreezeIssued():
+        # FIXME: Add variable sectorSize support for freeze
+        print("Freeze - sectorSize disabled")
+        sectorSize = None
+    # payloadMain body, and so every plugin hook, is compiled by SaveMap
+    with buildevent.stage("saveMap"), payloadstats.installCounter(ep):
+        ep.SaveMap(ofname, payloadMain, sectorSize=sectorSize)
+    if deadTriggerReport:
+        payloadstats.reportDeadTriggers()
+
+    if isFreezeIssued():
+        if isPromptIssued():
+            print("Freeze - prompt enabled ")
+            sys.stdout.flush()
+            os.system("pause")
+        print("[Stage 4/3] Applying freeze mpq modification...")
+        with buildevent.stage("freezeMpq"):
             try:
-                ofname = ofname.encode("mbcs")
+                encodedOfname = ofname.encode("mbcs")
             except LookupError:
-                ofname = ofname.encode(sys.getfilesystemencoding())
-            ret = freezeMpq.applyFreezeMpqModification(ofname, ofname)
+                encodedOfname = ofname.encode(sys.getfilesystemencoding())
+            ret = freezeMpq.applyFreezeMpqModification(encodedOfname, encodedOfname)
             if ret != 0:
                 raise RuntimeError("Error on mpq protection (%d)" % ret)
 
-        MessageBeep(MB_OK)
-        return True
-
-    except Exception as e:
-        print("==========================================")
-        MessageBeep(MB_ICONHAND)
-        exc_type, exc_value, exc_traceback = sys.exc_info()
-        excs = traceback.format_exception(exc_type, exc_value, exc_traceback)
-        formatted_excs = []
-
-        for i, exc in enumerate(excs):
-            if isEpExc(exc) and not all(isEpExc(e) for e in excs[i + 1 : -1]):
-                continue
-            ver = ep.eudplibVersion()
-            plibPath = (
-                'File "C:\\Py\\lib\\site-packages\\eudplib-%s-py3.8-win32.egg\\eudplib\\'
-                % ver
-            )
-            exc.replace(plibPath, 'eudplib File"')
-            formatted_excs.append(exc)
-
-        print("[Error] %s" % e, "".join(formatted_excs), file=sys.stderr)
-        if msgbox.isWindows:
-            msgbox.SetForegroundWindow(msgbox.GetConsoleWindow())
-        return False
+    buildevent.emitOutput(ofname)
+    MessageBeep(MB_OK)
+    return True
@@ -2,27 +2,42 @@
 # That would be handled properly by https protocol used by GitHub
 
 import atexit
-import io
+import json
 import os
 import re
 import sys
 import time
-import zipfile
 from threading import Thread
-from urllib.error import URLError
-from urllib.request import urlopen
 
 import msgbox
+from edpkgutil.manifest import getFileDigest
 
-VERSION_URL = "https://raw.githubusercontent.com/armoha/euddraft/master/latest/VERSION"
-RELEASE_URL = "https://github.com/armoha/euddraft/releases/download/v%s/euddraft%s.zip"
+VERSION_URL = os.environ.get(
+    "EUDDRAFT_VERSION_URL",
+    "https://raw.githubusercontent.com/armoha/euddraft/master/latest/VERSION",
+)
+RELEASE_URL = "https://github.com/armoha/euddraft/releases/download/v%s/%s"
+
+# Seconds to wait on each socket operation. Version check must never stall
+# a build on slow or blackholed networks.
+UPDATE_TIMEOUT = 5
+# Seconds for the whole version check. A server trickling data resets the
+# socket timeout on every read, so this bounds the check as a whole.
+UPDATE_DEADLINE = 15
+
+
+def isUpdateDisabled():
+    return os.environ.get("EUDDRAFT_NO_UPDATE", "") not in ("", "0")
 
 
 def download(url):
+    # urllib.request is slow to import. Don't make every startup pay for it.
+    from urllib.request import urlopen
+
     try:
-        with urlopen(url) as urlf:
+        with urlopen(url, timeout=UPDATE_TIMEOUT) as urlf:
             return urlf.read()
-    except URLError:
+    except (OSError, ValueError):  # URLError, socket.timeout, bad url
         return None
 
 
@@ -33,7 +48,7 @@ def getLatestUpdateCheckpoint():
         dataDir = os.path.dirname(sys.executable)
         with open(os.path.join(dataDir, "vcheckpoint.dat"), "r") as vchp:
             vstr = vchp.read()
-            match = re.match("(.+) (\d+)", vstr)
+            match = re.match(r"(.+) (\d+)", vstr)
             if not match:
                 raise OSError
             v = match.group(1)
@@ -62,9 +77,20 @@ def writeVersionCheckpoint(version):
 def getLatestVersion():
     v = download(VERSION_URL)
     if v is None:
-        return "0.0.0.0"
-    else:
-        return v.decode("utf-8")
+        return None
+    v = v.decode("utf-8", "ignore").strip()
+    if not re.fullmatch(r"\d+(\.\d+)*", v):
+        return None
+    return v
+
+
+def getLatestVersionWithin(deadline):
+    """getLatestVersion, or None if it doesn't finish within deadline seconds"""
+    result = []
+    thread = Thread(target=lambda: result.append(getLatestVersion()), daemon=True)
+    thread.start()
+    thread.join(deadline)
+    return result[0] if result else None
 
 
 def versionLt(version1, version2):
@@ -74,8 +100,134 @@ def versionLt(version1, version2):
     return normalize(version1) < normalize(version2)
 
 
-def getRelease(version):
-    return download(RELEASE_URL % (version, version))
+def getManifest(version):
+    """Per-file hash manifest of a release. None if release has no manifest"""
+    manifest = download(RELEASE_URL % (version, "euddraft%s.manifest.json" % version))
+    if manifest is None:
+        return None
+    try:
+        return json.loads(manifest.decode("utf-8"))
+    except ValueError:
+        return None
+
+
+def getOutdatedFiles(manifest, dataDir):
+    """Files in manifest which are missing or different in dataDir"""
+    outdated = set()
+    for path, digest in manifest["files"].items():
+        fname = os.path.join(dataDir, *path.split("/"))
+        try:
+            if getFileDigest(fname) == digest:
+                continue
+        except OSError:
+            pass
+        outdated.add(path)
+    return outdated
+
+
+def choosePackage(manifest, neededFiles):
+    """Smallest package in manifest containing every needed file.
+
+    None if no package does.
+    """
+    best = None
+    for name, package in manifest["packages"].items():
+        files = package.get("files")
+        if files is not None and not neededFiles.issubset(files):
+            continue
+        if best is None or package["size"] < best[1]["size"]:
+            best = name, package
+    return best
+
+
+def downloadFile(url, fname, sha256=None):
+    """Stream url to fname, verifying its sha256 if given.
+
+    Data is written to fname.part first. Download interrupted by network
+    error or a killed euddraft is resumed from there next time.
+    """
+    from urllib.error import HTTPError
+    from urllib.request import Request, urlopen
+
+    partName = fname + ".part"
+    try:
+        offset = os.path.getsize(partName)
+    except OSError:
+        offset = 0
+
+    request = Request(url)
+    if offset:
+        request.add_header("Range", "bytes=%d-" % offset)
+    try:
+        with urlopen(request, timeout=UPDATE_TIMEOUT) as urlf:
+            if urlf.status != 206:  # Server sends whole file
+                offset = 0
+            with open(partName, "ab" if offset else "wb") as f:
+                for chunk in iter(lambda: urlf.read(0x10000), b""):
+                    f.write(chunk)
+    except HTTPError as e:
+        if e.code != 416:  # 416: .part already has the whole file
+            return False
+    except (OSError, ValueError):
+        return False
+
+    if sha256 is not None and getFileDigest(partName) != sha256:
+        os.remove(partName)
+        return False
+    os.replace(partName, fname)
+    return True
+
+
+def downloadUpdate(version, dataDir, updateDir):
+    """Extract files of version which differ from installed ones to updateDir"""
+    import shutil
+    import zipfile
+
+    manifest = getManifest(version)
+    if manifest is None:
+        # Older releases only have a full package without checksum
+        packageName, package = "euddraft%s.zip" % version, {}
+        neededFiles = None
+    else:
+        neededFiles = getOutdatedFiles(manifest, dataDir)
+        best = choosePackage(manifest, neededFiles)
+        if best is None:
+            # No listed package covers the changed files. Full package is
+            # always published, even if the manifest doesn't list it.
+            best = "euddraft%s.zip" % version, {}
+        packageName, package = best
+        if "size" in package:
+            print(
+                " - %d files changed. Downloading %s (%d KiB)"
+                % (len(neededFiles), packageName, package["size"] // 1024)
+            )
+        else:
+            print(
+                " - %d files changed. Downloading %s"
+                % (len(neededFiles), packageName)
+            )
+
+    downloadDir = os.path.join(dataDir, "_download")
+    os.makedirs(downloadDir, exist_ok=True)
+    packagePath = os.path.join(downloadDir, packageName)
+    if not downloadFile(
+        RELEASE_URL % (version, packageName), packagePath, package.get("sha256")
+    ):
+        return False
+
+    # Extract next to updateDir and rename it at once, so that an
+    # interrupted extraction never leaves a partial updateDir behind.
+    extractDir = updateDir + ".part"
+    shutil.rmtree(extractDir, ignore_errors=True)
+    with zipfile.ZipFile(packagePath, "r") as zipf:
+        members = zipf.namelist()
+        if neededFiles is not None:
+            members = [m for m in members if m in neededFiles]
+        zipf.extractall(extractDir, members)
+    shutil.rmtree(updateDir, ignore_errors=True)
+    os.replace(extractDir, updateDir)
+    shutil.rmtree(downloadDir, ignore_errors=True)
+    return True
 
 
 def checkUpdate():
@@ -93,8 +245,14 @@ def checkUpdate():
     ):
         return lastCheckedVersion, False
 
+    latestVersion = getLatestVersionWithin(UPDATE_DEADLINE)
+    if latestVersion is None:
+        # Offline or timed out. Record the attempt, so that an unreachable
+        # server costs one timeout a day instead of one on every run.
+        writeVersionCheckpoint(lastCheckedVersion)
+        return
+
     # Re-write checkpoint time
-    latestVersion = getLatestVersion()
     if not versionLt(lastCheckedVersion, latestVersion):
         writeVersionCheckpoint(lastCheckedVersion)
         return
@@ -114,17 +272,17 @@ def checkUpdate():
         writeVersionCheckpoint(latestVersion)
         return
 
-    # Download the needed data
-    print("Downloading euddraft %s" % latestVersion)
-    release = getRelease(latestVersion)
-    if not release:
-        return msgbox.MessageBox("Update failed", "No release", textio=sys.stderr)
+    # Download on a non-daemon thread: euddraft waits for it on exit instead
+    # of killing it in the middle of writing _update.
+    Thread(target=installUpdate, args=(latestVersion,)).start()
 
+
+def installUpdate(version):
+    print("Downloading euddraft %s" % version)
     dataDir = os.path.dirname(sys.executable)
     updateDir = os.path.join(dataDir, "_update")
-
-    with zipfile.ZipFile(io.BytesIO(release), "r") as zipf:
-        zipf.extractall(updateDir)
+    if not downloadUpdate(version, dataDir, updateDir):
+        return msgbox.MessageBox("Update failed", "No release", textio=sys.stderr)
 
     # Write an auto-update script. This script will run after euddraft exits
     with open(os.path.join(dataDir, "_update.bat"), "w") as batf:
@@ -147,11 +305,13 @@ del _update.bat /q
 
 
 def issueAutoUpdate():
-    checkUpdateThread = Thread(target=checkUpdate)
+    if isUpdateDisabled():
+        return
+    checkUpdateThread = Thread(target=checkUpdate, daemon=True)
     checkUpdateThread.start()
-    # We don't join this thread. This thread will automatically join when
-    # the whole euddraft process is completed.
-    #
-    # Also, we don't want this thread to finish before it completes its update
-    # process, even if the main thread has already finished. So we don't make
-    # this thread a daemon thread.
+    # We don't join this thread, and it is a daemon thread: euddraft exits as
+    # soon as the build is done, even if the check is still waiting on the
+    # network. An interrupted check leaves vcheckpoint.dat untouched, so it is
+    # simply retried on the next run, and a check which gives up after
+    # UPDATE_DEADLINE is not retried for a day. Only the accepted download
+    # runs on a thread which euddraft waits for.
@@ -0,0 +1,167 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2014 trgk
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+# Build workers report their progress as plain dicts through a
+# multiprocessing queue. Every event has 'event' (kind) and 'time' keys.
+#
+#  stageStarted  : stage
+#  stageFinished : stage, duration, success
+#  pluginLoaded  : plugin, path, duration
+#  pluginTriggers: plugin, hook, count
+#  deadTriggers  : plugin, triggers, unreachable, neverRun, wastedBytes
+#  warning       : message, category, filename, lineno
+#  error         : message, exceptions
+#  output        : path, size, sha256
+#  finished      : success, retry, peakRSS
+
+import ctypes
+import os
+import sys
+import time
+import warnings
+from contextlib import contextmanager
+
+from edpkgutil.manifest import getFileDigest
+
+_eventQueue = None
+_listeners = []
+
+
+def setEventQueue(queue):
+    global _eventQueue
+    _eventQueue = queue
+
+
+def addListener(listener):
+    """Call listener(event) on every event in this process"""
+    _listeners.append(listener)
+
+
+def removeListener(listener):
+    _listeners.remove(listener)
+
+
+def emit(event, **fields):
+    if _eventQueue is None and not _listeners:
+        return
+    fields["event"] = event
+    fields["time"] = time.time()
+    for listener in _listeners:
+        listener(fields)
+    if _eventQueue is not None:
+        _eventQueue.put(fields)
+
+
+@contextmanager
+def stage(name):
+    emit("stageStarted", stage=name)
+    startTime = time.perf_counter()
+    success = False
+    try:
+        yield
+        success = True
+    finally:
+        emit(
+            "stageFinished",
+            stage=name,
+            duration=time.perf_counter() - startTime,
+            success=success,
+        )
+
+
+@contextmanager
+def captureWarnings():
+    oldShowWarning = warnings.showwarning
+
+    def showwarning(message, category, filename, lineno, file=None, line=None):
+        emit(
+            "warning",
+            message=str(message),
+            category=category.__name__,
+            filename=filename,
+            lineno=lineno,
+        )
+        oldShowWarning(message, category, filename, lineno, file, line)
+
+    warnings.showwarning = showwarning
+    try:
+        yield
+    finally:
+        warnings.showwarning = oldShowWarning
+
+
+def emitOutput(fname):
+    # Hashing the output is costly. Skip it when nobody listens.
+    if _eventQueue is None and not _listeners:
+        return
+    emit(
+        "output",
+        path=os.path.abspath(fname),
+        size=os.path.getsize(fname),
+        sha256=getFileDigest(fname),
+    )
+
+
+def getPeakRSS():
+    """Peak resident set size of the current process in bytes"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return _getPeakWorkingSetSize()
+
+    peakRSS = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peakRSS
+    return peakRSS * 1024  # KiB on linux
+
+
+def _getPeakWorkingSetSize():
+    from ctypes.wintypes import DWORD
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            ("cb", DWORD),
+            ("PageFaultCount", DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    try:
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(
+            process, ctypes.byref(counters), counters.cb
+        ):
+            return None
+    except (AttributeError, OSError):
+        return None
+    return counters.PeakWorkingSetSize
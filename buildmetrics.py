@@ -0,0 +1,214 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2014 trgk
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+# Rolling build statistics of the .edd daemon.
+#
+#  http://127.0.0.1:<port>/metrics : Prometheus text format
+#  http://127.0.0.1:<port>/history : JSON list of recent builds
+
+import json
+import threading
+from collections import Counter, defaultdict, deque
+
+
+def summarizeBuild(target, queuedTime, events, attempts=1):
+    """Make a build record from build events of a daemon worker"""
+    build = {
+        "target": target,
+        "queuedTime": queuedTime,
+        "queueTime": None,
+        "attempts": attempts,
+        "stages": {},
+        "plugins": {},
+        "triggers": {},  # plugin -> hook -> trigger count
+        "warnings": 0,
+        "success": False,
+        "outputSize": None,
+        "outputSha256": None,
+        "peakRSS": None,
+    }
+    for event in events:
+        kind = event["event"]
+        if kind == "stageStarted" and build["queueTime"] is None:
+            build["queueTime"] = max(0.0, event["time"] - queuedTime)
+        elif kind == "stageFinished":
+            build["stages"][event["stage"]] = event["duration"]
+        elif kind == "pluginLoaded":
+            build["plugins"][event["plugin"]] = event["duration"]
+        elif kind == "pluginTriggers":
+            hooks = build["triggers"].setdefault(event["plugin"], {})
+            hooks[event["hook"]] = event["count"]
+        elif kind == "warning":
+            build["warnings"] += 1
+        elif kind == "output":
+            build["outputSize"] = event["size"]
+            build["outputSha256"] = event["sha256"]
+        elif kind == "finished":
+            build["success"] = bool(event["success"])
+            build["peakRSS"] = event.get("peakRSS")
+            build["finishedTime"] = event["time"]
+    return build
+
+
+def _escapeLabel(s):
+    return str(s).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return ",".join('%s="%s"' % (k, _escapeLabel(v)) for k, v in labels.items())
+
+
+class BuildMetrics:
+    def __init__(self, historySize=200):
+        self._lock = threading.Lock()
+        self.history = deque(maxlen=historySize)
+        self.buildCount = Counter()  # (target, result)
+        self.queueTime = defaultdict(lambda: [0.0, 0])  # target -> [sum, count]
+        self.stageTime = defaultdict(lambda: [0.0, 0])  # (target, stage)
+        self.lastBuild = {}  # target -> build record
+
+    def addBuild(self, build):
+        target = build["target"]
+        with self._lock:
+            self.history.append(build)
+            result = "success" if build["success"] else "failure"
+            self.buildCount[target, result] += 1
+            if build["queueTime"] is not None:
+                q = self.queueTime[target]
+                q[0] += build["queueTime"]
+                q[1] += 1
+            for stage, duration in build["stages"].items():
+                s = self.stageTime[target, stage]
+                s[0] += duration
+                s[1] += 1
+            self.lastBuild[target] = build
+
+    def toPrometheus(self):
+        lines = []
+
+        def metric(name, mtype, helpText, samples):
+            lines.append("# HELP %s %s" % (name, helpText))
+            lines.append("# TYPE %s %s" % (name, mtype))
+            for suffix, labels, value in samples:
+                lines.append("%s%s{%s} %s" % (name, suffix, labels, value))
+
+        with self._lock:
+            metric(
+                "euddraft_builds_total",
+                "counter",
+                "Number of finished builds.",
+                [
+                    ("", _labels(target=t, result=r), n)
+                    for (t, r), n in sorted(self.buildCount.items())
+                ],
+            )
+            metric(
+                "euddraft_build_queue_seconds",
+                "summary",
+                "Time from file change detection to the first build stage.",
+                [
+                    (suffix, _labels(target=t), v)
+                    for t, (total, count) in sorted(self.queueTime.items())
+                    for suffix, v in (("_sum", total), ("_count", count))
+                ],
+            )
+            metric(
+                "euddraft_build_stage_seconds",
+                "summary",
+                "Duration of each build stage.",
+                [
+                    (suffix, _labels(target=t, stage=s), v)
+                    for (t, s), (total, count) in sorted(self.stageTime.items())
+                    for suffix, v in (("_sum", total), ("_count", count))
+                ],
+            )
+            metric(
+                "euddraft_last_build_stage_seconds",
+                "gauge",
+                "Duration of each stage in the latest build.",
+                [
+                    ("", _labels(target=t, stage=s), v)
+                    for t, build in sorted(self.lastBuild.items())
+                    for s, v in build["stages"].items()
+                ],
+            )
+            metric(
+                "euddraft_last_output_bytes",
+                "gauge",
+                "Output map size of the latest build.",
+                [
+                    ("", _labels(target=t), build["outputSize"])
+                    for t, build in sorted(self.lastBuild.items())
+                    if build["outputSize"] is not None
+                ],
+            )
+            metric(
+                "euddraft_last_worker_peak_rss_bytes",
+                "gauge",
+                "Peak resident memory of the latest build worker.",
+                [
+                    ("", _labels(target=t), build["peakRSS"])
+                    for t, build in sorted(self.lastBuild.items())
+                    if build["peakRSS"] is not None
+                ],
+            )
+        return "\n".join(lines) + "\n"
+
+    def toJSON(self):
+        with self._lock:
+            return json.dumps(list(self.history), indent=2)
+
+
+def startMetricsServer(metrics, port, host="127.0.0.1"):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            if path == "/metrics":
+                body = metrics.toPrometheus()
+                contentType = "text/plain; version=0.0.4; charset=utf-8"
+            elif path == "/history":
+                body = metrics.toJSON()
+                contentType = "application/json"
+            else:
+                self.send_error(404)
+                return
+            body = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", contentType)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Don't clutter daemon console
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    serverThread = threading.Thread(target=server.serve_forever, daemon=True)
+    serverThread.start()
+    print(" - Build metrics on http://%s:%d/metrics" % server.server_address[:2])
+    return server
@@ -0,0 +1,212 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2014 trgk
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+# Sampling profiler for `euddraft --profile`.
+#
+# A background thread samples the stack of the build thread at a fixed
+# interval. Build stages and plugin loads are recorded as spans from build
+# events. Results are written as
+#
+#  <prefix>.trace.json    : Chrome trace events (chrome://tracing, Perfetto)
+#  <prefix>.collapsed.txt : collapsed stacks for flamegraph.pl / speedscope
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import buildevent
+
+
+class SamplingProfiler:
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.threadId = None
+        self.samples = []  # (perf_counter, (code, ...) from root)
+        self.spans = []  # (name, category, start, end)
+        self._openStages = {}
+        self._stopEvent = threading.Event()
+        self._thread = None
+        self._startTime = None
+        self._oldSwitchInterval = None
+
+    def start(self):
+        self.threadId = threading.get_ident()
+        self._startTime = time.perf_counter()
+        buildevent.addListener(self.onEvent)
+        # Sampler thread needs the GIL to take a sample. Make the build thread
+        # hand it over at sampling rate instead of every 5ms.
+        self._oldSwitchInterval = sys.getswitchinterval()
+        sys.setswitchinterval(self.interval)
+        self._thread = threading.Thread(target=self._sampleLoop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopEvent.set()
+        self._thread.join()
+        sys.setswitchinterval(self._oldSwitchInterval)
+        buildevent.removeListener(self.onEvent)
+        now = time.perf_counter()
+        for name, start in self._openStages.items():
+            self.spans.append((name, "stage", start, now))
+        self._openStages.clear()
+
+    def _sampleLoop(self):
+        currentFrames = sys._current_frames
+        while not self._stopEvent.wait(self.interval):
+            frame = currentFrames().get(self.threadId)
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append((time.perf_counter(), tuple(stack)))
+
+    def onEvent(self, event):
+        now = time.perf_counter()
+        kind = event["event"]
+        if kind == "stageStarted":
+            self._openStages[event["stage"]] = now
+        elif kind == "stageFinished":
+            start = self._openStages.pop(event["stage"], now - event["duration"])
+            self.spans.append((event["stage"], "stage", start, now))
+        elif kind == "pluginLoaded":
+            name = "load %s" % event["plugin"]
+            self.spans.append((name, "plugin", now - event["duration"], now))
+
+    # ----------------------------------------------------------------------
+
+    def _frameNames(self):
+        names = {}
+
+        def getName(code):
+            try:
+                return names[code]
+            except KeyError:
+                name = "%s (%s:%d)" % (
+                    code.co_name,
+                    os.path.basename(code.co_filename),
+                    code.co_firstlineno,
+                )
+                names[code] = name
+                return name
+
+        return getName
+
+    def getCollapsedStacks(self):
+        getName = self._frameNames()
+        counter = Counter(stack for _, stack in self.samples if stack)
+        return [
+            (";".join(getName(code) for code in stack), count)
+            for stack, count in counter.most_common()
+        ]
+
+    def getTraceEvents(self):
+        getName = self._frameNames()
+        pid = os.getpid()
+
+        def us(t):
+            return (t - self._startTime) * 1e6
+
+        def metadata(kind, tid, name):
+            args = {"name": name}
+            return {"name": kind, "ph": "M", "pid": pid, "tid": tid, "args": args}
+
+        events = [
+            metadata("process_name", 0, "euddraft"),
+            metadata("thread_name", 1, "stages"),
+            metadata("thread_name", 2, "samples"),
+        ]
+        for name, category, start, end in self.spans:
+            events.append(
+                {
+                    "name": name,
+                    "cat": category,
+                    "ph": "X",
+                    "ts": us(start),
+                    "dur": us(end) - us(start),
+                    "pid": pid,
+                    "tid": 1,
+                }
+            )
+
+        # Merge consecutive samples sharing stack prefixes into nested spans
+        openFrames = []  # (code, start)
+
+        def closeFrames(depth, end):
+            while len(openFrames) > depth:
+                code, start = openFrames.pop()
+                events.append(
+                    {
+                        "name": getName(code),
+                        "cat": "sample",
+                        "ph": "X",
+                        "ts": us(start),
+                        "dur": us(end) - us(start),
+                        "pid": pid,
+                        "tid": 2,
+                    }
+                )
+
+        for t, stack in self.samples:
+            common = 0
+            while (
+                common < len(openFrames)
+                and common < len(stack)
+                and openFrames[common][0] is stack[common]
+            ):
+                common += 1
+            closeFrames(common, t)
+            for code in stack[common:]:
+                openFrames.append((code, t))
+        if self.samples:
+            closeFrames(0, self.samples[-1][0] + self.interval)
+        return events
+
+    def write(self, prefix):
+        with open(prefix + ".trace.json", "w") as f:
+            trace = {"traceEvents": self.getTraceEvents(), "displayTimeUnit": "ms"}
+            json.dump(trace, f)
+        with open(prefix + ".collapsed.txt", "w", encoding="utf-8") as f:
+            for stack, count in self.getCollapsedStacks():
+                f.write("%s %d\n" % (stack, count))
+
+
+@contextmanager
+def profile(prefix, interval=0.001):
+    profiler = SamplingProfiler(interval)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        profiler.write(prefix)
+        print(
+            "Profile: %d samples -> %s.trace.json, %s.collapsed.txt"
+            % (len(profiler.samples), prefix, prefix)
+        )
@@ -1,26 +1,22 @@
-# Test script for profiling.
-# This requires Roulette map, eudtrglib map.
+# Build one benchmark case in this process, for use under a profiler.
+# Run `python -m edbench.suite` for timings of every case.
+#
+#   python ed_profile.py [case name (default: msqc-100)]
 
 import os
 import sys
+import tempfile
 
-sys.path.insert(1, os.path.abspath("."))
-os.chdir("../Roulette")
-sys.path.insert(1, os.path.abspath("."))
-sys.path.insert(1, os.path.abspath("../eudtrglib"))
-
+sys.path.insert(1, os.path.dirname(os.path.abspath(__file__)))
 
 import euddraft
+from edbench.suite import getCase, prepareCase
 
 
 def f():
-    euddraft.applyEUDDraft("main.edd")
-
+    caseName = sys.argv[1] if len(sys.argv) > 1 else "msqc-100"
+    edsPath = prepareCase(getCase(caseName), tempfile.mkdtemp(prefix="edbench"))
+    euddraft.applyEUDDraftIn(edsPath, None)
 
-if False:
-    from tests import profile_tool
-    profile_tool.profile(f, '../euddraft/profile.json')
-else:
-    f()
 
-os.chdir("../euddraft")
+f()
@@ -0,0 +1,144 @@
+# Performance regression gate.
+#
+# Runs the benchmark suite several times, takes the median of each metric and
+# compares it with a baseline results file. Exits with 1 if any stage or
+# plugin got slower, or any payload got bigger, by more than the threshold.
+#
+#   python -m edbench.compare baseline.json [--repeat 3] [--threshold 0.1]
+#   python -m edbench.compare baseline.json --current results.json ...
+
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+
+from payloadstats import loopHooks
+
+from .suite import getCases, runSuite
+
+# Time differences under this many seconds are noise
+minTimeDelta = 0.05
+
+
+def getMetrics(build):
+    """name -> (value, kind) of a build record. kind is 'time' or 'count'"""
+    metrics = {}
+    for stage, duration in build["stages"].items():
+        metrics["stage:%s" % stage] = (duration, "time")
+    if build["stages"]:
+        metrics["buildTime"] = (sum(build["stages"].values()), "time")
+    for plugin, duration in build["plugins"].items():
+        metrics["pluginLoad:%s" % plugin] = (duration, "time")
+    if build["outputSize"] is not None:
+        metrics["outputSize"] = (build["outputSize"], "count")
+    for plugin, hooks in build.get("triggers", {}).items():
+        for hook, count in hooks.items():
+            metrics["triggers:%s:%s" % (plugin, hook)] = (count, "count")
+        frameTriggers = sum(hooks.get(hook, 0) for hook in loopHooks)
+        metrics["frameTriggers:%s" % plugin] = (frameTriggers, "count")
+    return metrics
+
+
+def medianBuild(builds):
+    """Build record holding median of each metric over builds"""
+    build = dict(builds[-1])
+    build["success"] = all(b["success"] for b in builds)
+    build["runs"] = len(builds)
+    build["metrics"] = {}
+    values = {}
+    for b in builds:
+        for name, (value, kind) in getMetrics(b).items():
+            values.setdefault(name, (kind, []))[1].append(value)
+    for name, (kind, vs) in values.items():
+        build["metrics"][name] = [statistics.median(vs), kind]
+    return build
+
+
+def mergeRuns(runs):
+    """Merge suite results of several runs into one with median metrics"""
+    results = {}
+    for name in runs[0]["results"]:
+        builds = [r["results"][name] for r in runs if name in r["results"]]
+        results[name] = medianBuild(builds)
+    return {"meta": runs[-1]["meta"], "results": results}
+
+
+def getBuildMetrics(build):
+    if "metrics" in build:
+        return {name: tuple(v) for name, v in build["metrics"].items()}
+    return getMetrics(build)
+
+
+def findRegressions(baseline, current, threshold):
+    regressions = []
+    for caseName, baseBuild in sorted(baseline["results"].items()):
+        build = current["results"].get(caseName)
+        if build is None:
+            continue
+        if baseBuild["success"] and not build["success"]:
+            regressions.append((caseName, "success", 1, 0))
+            continue
+        baseMetrics = getBuildMetrics(baseBuild)
+        for name, (value, kind) in sorted(getBuildMetrics(build).items()):
+            if name not in baseMetrics:
+                continue
+            baseValue = baseMetrics[name][0]
+            if value <= baseValue * (1 + threshold):
+                continue
+            if kind == "time" and value - baseValue < minTimeDelta:
+                continue
+            regressions.append((caseName, name, baseValue, value))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="edbench.compare")
+    parser.add_argument("baseline", help="Baseline results file")
+    parser.add_argument(
+        "--current", action="append", help="Compare these results instead of running"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--threshold", type=float, default=0.1, help="Allowed relative increase"
+    )
+    parser.add_argument("-o", "--out", help="Write median results here")
+    parser.add_argument("--workdir", help="Keep generated files here")
+    args = parser.parse_args()
+
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+
+    if args.current:
+        runs = []
+        for fname in args.current:
+            with open(fname, "r") as f:
+                runs.append(json.load(f))
+    else:
+        cases = [c for c in getCases() if c["name"] in baseline["results"]]
+        workdir = args.workdir or tempfile.mkdtemp(prefix="edbench")
+        runs = [runSuite(cases, workdir) for _ in range(args.repeat)]
+    current = mergeRuns(runs)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(current, f, indent=2)
+
+    regressions = findRegressions(baseline, current, args.threshold)
+    for caseName, name, baseValue, value in regressions:
+        if baseValue:
+            change = "%+.1f%%" % ((value / baseValue - 1) * 100)
+        else:
+            change = "new"
+        print(
+            "REGRESSION %s %s: %g -> %g (%s)"
+            % (caseName, name, baseValue, value, change)
+        )
+    if regressions:
+        print("%d regression(s) over %g%%" % (len(regressions), args.threshold * 100))
+        sys.exit(1)
+    print("No regression over %g%%" % (args.threshold * 100))
+
+
+if __name__ == "__main__":
+    main()
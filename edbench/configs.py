@@ -0,0 +1,52 @@
+# Synthetic .eds settings for benchmarks.
+
+from itertools import combinations
+
+msqcKeys = (
+    [chr(c) for c in range(ord("A"), ord("Z") + 1)]
+    + [str(d) for d in range(10)]
+    + ["F%d" % n for n in range(1, 25)]
+)
+msqcModifiers = ["LCTRL", "LALT", "SHIFT", "TAB", "SPACE", "CAPSLOCK", "LWIN", "ESC"]
+
+
+def msqcSettings(bindings):
+    """MSQC settings with given number of distinct key bindings"""
+    modifierSets = [()] + [(m,) for m in msqcModifiers]
+    modifierSets += list(combinations(msqcModifiers, 2))
+    assert bindings <= len(msqcKeys) * len(modifierSets)
+
+    settings = {}
+    for i in range(bindings):
+        key = msqcKeys[i % len(msqcKeys)]
+        modifiers = modifierSets[i // len(msqcKeys)]
+        conds = ["KeyDown(%s)" % key] + ["KeyPress(%s)" % m for m in modifiers]
+        settings["; ".join(conds)] = "%d, 1" % (150 + i % 50)
+    return settings
+
+
+def chatEventSettings(messages):
+    """chatEvent settings with given number of distinct messages"""
+    settings = {"__addr__": "0x58D900"}
+    for i in range(messages):
+        settings["bench message %d" % i] = str(i + 1)
+    return settings
+
+
+def writeEds(fname, inputMap, outputMap, plugins):
+    """Write .eds setting file
+
+    Arguments:
+        fname {str} -- Output .eds file
+        inputMap {str} -- Input map path
+        outputMap {str} -- Output map path
+        plugins {dict} -- Plugin name -> settings dict
+    """
+    lines = ["[main]", "input: %s" % inputMap, "output: %s" % outputMap, ""]
+    for pluginName, settings in plugins.items():
+        lines.append("[%s]" % pluginName)
+        for key, value in settings.items():
+            lines.append("%s : %s" % (key, value))
+        lines.append("")
+    with open(fname, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
@@ -0,0 +1,230 @@
+# Synthetic input maps for benchmarks.
+#
+# Writes a minimal uncompressed MPQ holding a scenario.chk with the sections
+# eudplib reads. Maps are deterministic for the same parameters, but they
+# have no valid VCOD section so StarCraft itself won't open them.
+
+import struct
+
+# ----------------------------------------------------------------------------
+# MPQ
+
+
+def _makeCryptTable():
+    table = [0] * 0x500
+    seed = 0x00100001
+    for index1 in range(0x100):
+        index2 = index1
+        for _ in range(5):
+            seed = (seed * 125 + 3) % 0x2AAAAB
+            temp1 = (seed & 0xFFFF) << 0x10
+            seed = (seed * 125 + 3) % 0x2AAAAB
+            temp2 = seed & 0xFFFF
+            table[index2] = temp1 | temp2
+            index2 += 0x100
+    return table
+
+
+_cryptTable = _makeCryptTable()
+
+HASH_OFFSET, HASH_NAME_A, HASH_NAME_B, HASH_FILE_KEY = range(4)
+MPQ_FILE_EXISTS = 0x80000000
+
+
+def hashString(s, hashType):
+    seed1, seed2 = 0x7FED7FED, 0xEEEEEEEE
+    for ch in s.upper().replace("/", "\\").encode("ascii"):
+        seed1 = _cryptTable[(hashType << 8) + ch] ^ ((seed1 + seed2) & 0xFFFFFFFF)
+        seed2 = (ch + seed1 + seed2 + (seed2 << 5) + 3) & 0xFFFFFFFF
+    return seed1
+
+
+def encrypt(data, key):
+    words = struct.unpack("<%dI" % (len(data) // 4), data)
+    seed = 0xEEEEEEEE
+    out = []
+    for word in words:
+        seed = (seed + _cryptTable[0x400 + (key & 0xFF)]) & 0xFFFFFFFF
+        out.append(word ^ ((key + seed) & 0xFFFFFFFF))
+        key = ((((~key) << 0x15) + 0x11111111) & 0xFFFFFFFF) | (key >> 0x0B)
+        seed = (word + seed + (seed << 5) + 3) & 0xFFFFFFFF
+    return struct.pack("<%dI" % len(out), *out)
+
+
+def writeMPQ(fname, files):
+    """Write an MPQ archive with uncompressed files
+
+    Arguments:
+        fname {str} -- Output file
+        files {dict} -- Archived name -> bytes
+    """
+    files = dict(files)
+    files["(listfile)"] = "\r\n".join(files).encode("ascii") + b"\r\n"
+
+    hashTableSize = 16
+    while hashTableSize < len(files) * 2:
+        hashTableSize *= 2
+
+    headerSize = 32
+    body = b""
+    blockTable = b""
+    hashTable = [None] * hashTableSize
+    for blockIndex, (name, data) in enumerate(files.items()):
+        blockTable += struct.pack(
+            "<4I", headerSize + len(body), len(data), len(data), MPQ_FILE_EXISTS
+        )
+        body += data
+        pos = hashString(name, HASH_OFFSET) & (hashTableSize - 1)
+        while hashTable[pos] is not None:
+            pos = (pos + 1) & (hashTableSize - 1)
+        hashTable[pos] = struct.pack(
+            "<2I2HI",
+            hashString(name, HASH_NAME_A),
+            hashString(name, HASH_NAME_B),
+            0,  # locale
+            0,  # platform
+            blockIndex,
+        )
+    hashTable = b"".join(entry or b"\xFF" * 16 for entry in hashTable)
+
+    hashTablePos = headerSize + len(body)
+    blockTablePos = hashTablePos + len(hashTable)
+    archiveSize = blockTablePos + len(blockTable)
+    header = struct.pack(
+        "<4s2I2H4I",
+        b"MPQ\x1A",
+        headerSize,
+        archiveSize,
+        0,  # format version
+        3,  # sector size: 512 << 3
+        hashTablePos,
+        blockTablePos,
+        hashTableSize,
+        len(files),
+    )
+    with open(fname, "wb") as f:
+        f.write(header)
+        f.write(body)
+        f.write(encrypt(hashTable, hashString("(hash table)", HASH_FILE_KEY)))
+        f.write(encrypt(blockTable, hashString("(block table)", HASH_FILE_KEY)))
+
+
+# ----------------------------------------------------------------------------
+# CHK
+
+
+def _section(name, data):
+    return name.encode("ascii").ljust(4) + struct.pack("<I", len(data)) + data
+
+
+def _makeStringTable(strings, count=1024):
+    offsets = []
+    data = b""
+    dataStart = 2 + 2 * count
+    emptyOffset = None
+    for i in range(count):
+        if i < len(strings):
+            offsets.append(dataStart + len(data))
+            data += strings[i].encode("utf-8") + b"\0"
+        else:
+            if emptyOffset is None:
+                emptyOffset = dataStart + len(data)
+                data += b"\0"
+            offsets.append(emptyOffset)
+    return struct.pack("<%dH" % (count + 1), count, *offsets) + data
+
+
+def _makeTrigger(player):
+    # Always -> SetDeaths(CurrentPlayer, Add, 1, 0); PreserveTrigger
+    conditions = struct.pack("<3IH4BH", 0, 0, 0, 0, 0, 22, 0, 0, 0)
+    conditions = conditions.ljust(20 * 16, b"\0")
+    actions = struct.pack("<6IH4B2x", 0, 0, 0, 0, 13, 1, 0, 45, 8, 0, 0)
+    actions += struct.pack("<6IH4B2x", 0, 0, 0, 0, 0, 0, 0, 3, 0, 0, 0)
+    actions = actions.ljust(32 * 64, b"\0")
+    players = bytes(1 if p == player else 0 for p in range(28))
+    return conditions + actions + struct.pack("<I", 0) + players
+
+
+def makeCHK(width, height, humans, triggers=0):
+    """Make scenario.chk
+
+    Arguments:
+        width {int} -- Map width in tiles
+        height {int} -- Map height in tiles
+        humans {int} -- Number of human players (1~8)
+
+    Keyword Arguments:
+        triggers {int} -- Number of map triggers, spread over human players
+    """
+    assert 1 <= humans <= 8
+    strings = ["Benchmark map", "%dx%d, %d players" % (width, height, humans)]
+    strings += ["Force %d" % (i + 1) for i in range(4)]
+    strings += ["Anywhere"]
+    anywhereString = len(strings)
+
+    ownr = bytes([6] * humans + [0] * (8 - humans) + [0, 0, 0, 7])
+    side = bytes([5] * 8 + [7, 7, 7, 4])
+
+    units = b""
+    for p in range(humans):
+        x, y = 32 * (4 + p * (width - 8) // 8), 32 * (height // 2)
+        units += struct.pack(
+            "<I6H4BI2H2I", p, x, y, 214, 0, 0, 0, p, 100, 100, 100, 0, 0, 0, 0, 0
+        )
+
+    locations = bytearray(20 * 255)
+    # Location 64: Anywhere
+    struct.pack_into(
+        "<4I2H", locations, 20 * 63, 0, 0, width * 32, height * 32, anywhereString, 0
+    )
+
+    trig = b"".join(_makeTrigger(i % humans) for i in range(triggers))
+
+    def unitSettings(weapons):
+        return bytes([1] * 228) + bytes(228 * 15 + weapons * 4)
+
+    sections = [
+        ("TYPE", b"RAWB"),
+        ("VER", struct.pack("<H", 205)),
+        ("IVER", struct.pack("<H", 10)),
+        ("IVE2", struct.pack("<H", 11)),
+        ("VCOD", bytes(1040)),
+        ("IOWN", ownr),
+        ("OWNR", ownr),
+        ("ERA", struct.pack("<H", 0)),
+        ("DIM", struct.pack("<2H", width, height)),
+        ("SIDE", side),
+        ("MTXM", bytes(width * height * 2)),
+        ("PUNI", bytes([1] * (228 * 12 + 228)) + bytes([1] * 228 * 12)),
+        ("UPGR", bytes(46 * 12 * 2 + 46 * 2) + bytes([1] * 46 * 12)),
+        ("PTEC", bytes(24 * 12 * 2 + 24 * 2) + bytes([1] * 24 * 12)),
+        ("UNIT", units),
+        ("DD2", b""),
+        ("THG2", b""),
+        ("MASK", b"\xFF" * (width * height)),
+        ("STR", _makeStringTable(strings)),
+        ("UPRP", bytes(64 * 20)),
+        ("UPUS", bytes(64)),
+        ("MRGN", bytes(locations)),
+        ("TRIG", trig),
+        ("MBRF", b""),
+        ("SPRP", struct.pack("<2H", 1, 2)),
+        ("FORC", bytes(8) + struct.pack("<4H", 3, 4, 5, 6) + bytes(4)),
+        ("WAV", bytes(512 * 4)),
+        ("UNIS", unitSettings(100)),
+        ("UPGS", bytes([1] * 46) + bytes(46 * 12)),
+        ("TECS", bytes([1] * 24) + bytes(24 * 8)),
+        ("SWNM", bytes(256 * 4)),
+        ("COLR", bytes(range(8))),
+        ("PUPx", bytes(61 * 12 * 2 + 61 * 2) + bytes([1] * 61 * 12)),
+        ("PTEx", bytes(44 * 12 * 2 + 44 * 2) + bytes([1] * 44 * 12)),
+        ("UNIx", unitSettings(130)),
+        ("UPGx", bytes([1] * 61) + b"\0" + bytes(61 * 12)),
+        ("TECx", bytes([1] * 44) + bytes(44 * 8)),
+    ]
+    return b"".join(_section(name, data) for name, data in sections)
+
+
+def generateMap(fname, width, height, humans, triggers=0):
+    chk = makeCHK(width, height, humans, triggers)
+    writeMPQ(fname, {"staredit\\scenario.chk": chk})
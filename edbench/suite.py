@@ -0,0 +1,153 @@
+# Benchmark suite. Builds synthetic maps with synthetic settings, each in a
+# fresh process, and writes build stage timings as JSON.
+#
+#   python -m edbench.suite [-o results.json] [-k filter] [--workdir dir]
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import platform
+import sys
+import tempfile
+import time
+from queue import Empty
+
+from buildmetrics import summarizeBuild
+
+from .configs import chatEventSettings, msqcSettings, writeEds
+from .mapgen import generateMap
+
+# name -> (width, height, humans, triggers)
+maps = {
+    "small": (64, 64, 2, 64),
+    "medium": (128, 128, 4, 512),
+    "large": (256, 256, 8, 2048),
+}
+
+
+def getCases():
+    cases = []
+    for mapName in maps:
+        cases.append({"name": "empty-%s" % mapName, "map": mapName, "plugins": {}})
+    for n in (10, 100, 500):
+        cases.append(
+            {
+                "name": "msqc-%d" % n,
+                "map": "medium",
+                "plugins": {"MSQC": msqcSettings(n)},
+            }
+        )
+    for n in (10, 1000, 5000):
+        cases.append(
+            {
+                "name": "chatEvent-%d" % n,
+                "map": "medium",
+                "plugins": {"chatEvent": chatEventSettings(n)},
+            }
+        )
+    return cases
+
+
+def getCase(name):
+    for case in getCases():
+        if case["name"] == name:
+            return case
+    raise KeyError(name)
+
+
+def prepareCase(case, workdir):
+    """Generate input map and .eds of case. Returns .eds path"""
+    mapDir = os.path.join(workdir, "maps")
+    outDir = os.path.join(workdir, "out")
+    os.makedirs(mapDir, exist_ok=True)
+    os.makedirs(outDir, exist_ok=True)
+
+    inputMap = os.path.join(mapDir, "%s.scx" % case["map"])
+    if not os.path.exists(inputMap):
+        generateMap(inputMap, *maps[case["map"]])
+    outputMap = os.path.join(outDir, "%s.scx" % case["name"])
+    edsPath = os.path.join(workdir, "%s.eds" % case["name"])
+    writeEds(edsPath, inputMap, outputMap, case["plugins"])
+    return edsPath
+
+
+def runCase(case, workdir, timeout=600):
+    """Build case in a fresh process. Returns build record"""
+    import euddraft
+
+    edsPath = prepareCase(case, workdir)
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    events = []
+    startTime = time.time()
+    process = ctx.Process(target=euddraft.applyEUDDraftIn, args=(edsPath, queue))
+    process.start()
+    while time.time() - startTime < timeout:
+        try:
+            event = queue.get(timeout=0.5)
+        except Empty:
+            if not process.is_alive():
+                break
+            continue
+        events.append(event)
+        if event["event"] == "finished":
+            break
+    process.join(5)
+    if process.is_alive():
+        process.kill()
+
+    build = summarizeBuild(case["name"], startTime, events)
+    build["wallTime"] = time.time() - startTime
+    build["map"] = case["map"]
+    build["errors"] = [e["message"] for e in events if e["event"] == "error"]
+    return build
+
+
+def runSuite(cases, workdir):
+    results = {}
+    for case in cases:
+        print("[edbench] %s" % case["name"], file=sys.stderr)
+        build = runCase(case, workdir)
+        results[case["name"]] = build
+        status = "ok" if build["success"] else "FAILED"
+        print(
+            "[edbench] %s %s (%.2fs)" % (case["name"], status, build["wallTime"]),
+            file=sys.stderr,
+        )
+    return {
+        "meta": {
+            "time": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "maps": maps,
+        },
+        "results": results,
+    }
+
+
+def selectCases(filters):
+    cases = getCases()
+    if filters:
+        cases = [c for c in cases if any(f in c["name"] for f in filters)]
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="edbench.suite")
+    parser.add_argument("-o", "--out", default="bench_results.json")
+    parser.add_argument(
+        "-k", "--filter", action="append", help="Run cases containing this"
+    )
+    parser.add_argument("--workdir", help="Keep generated files here")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="edbench")
+    results = runSuite(selectCases(args.filter), workdir)
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print("Results written to %s" % args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2014 trgk
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+# .edd daemon. Watches every target with one file watcher and rebuilds
+# the targets affected by changed files on a bounded pool of workers.
+
+import multiprocessing as mp
+import os
+import re
+import sys
+import time
+from queue import Empty
+
+import msgbox
+from buildmetrics import BuildMetrics, startMetricsServer, summarizeBuild
+from pluginLoader import getGlobalPluginDirectory, getPluginPath
+from readconfig import readconfig
+
+maxAttempts = 5
+
+
+def isIgnoredFile(path):
+    # Ignore profile things
+    return path.endswith(".epmap") or path.endswith(".epmap.prof")
+
+
+def getFileTime(path):
+    try:
+        return max(os.path.getmtime(path), os.path.getctime(path))
+    except OSError:
+        return None
+
+
+def isUnder(path, dirname):
+    return path.startswith(os.path.join(dirname, ""))
+
+
+# 'import a.b, c' / 'from a.b import c' of python, 'import a.b;' of epScript
+_importRegex = re.compile(
+    r"^[ \t]*(?:from[ \t]+([\w.]+)[ \t]+import|import[ \t]+([^;#\n]+))", re.M
+)
+_importCache = {}  # path -> (file time, imported module names)
+
+
+def getImportedModules(path):
+    fileTime = getFileTime(path)
+    cached = _importCache.get(path)
+    if cached is not None and cached[0] == fileTime:
+        return cached[1]
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            source = f.read()
+    except OSError:
+        source = ""
+    modules = set()
+    for fromName, importNames in _importRegex.findall(source):
+        names = [fromName] if fromName else importNames.split(",")
+        for name in names:
+            tokens = name.split()  # 'a.b as c'
+            if tokens and not tokens[0].startswith("."):
+                modules.add(tokens[0].split(".")[0])
+    _importCache[path] = fileTime, modules
+    return modules
+
+
+def getPluginDependencies(pluginPaths):
+    """Files and packages next to plugins which the plugins import"""
+    dependencies = set()
+    stack = list(pluginPaths)
+    while stack:
+        path = stack.pop()
+        dirname = os.path.dirname(path)
+        for module in getImportedModules(path):
+            for candidate in (module + ".py", module + ".eps", module):
+                candidate = os.path.join(dirname, candidate)
+                if candidate in dependencies or not os.path.exists(candidate):
+                    continue
+                dependencies.add(candidate)
+                if os.path.isfile(candidate):
+                    stack.append(candidate)
+    return dependencies
+
+
+class BuildTarget:
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.dirname, self.filename = os.path.split(self.path)
+        self.inputMap = None
+        self.outputMap = None
+        self.pluginPaths = set()
+        self.pluginDependencies = set()
+        self.metricsPort = None
+        self.error = None
+
+    def reload(self):
+        # input map may change with edd update. We re-read the setting
+        # file every time here.
+        try:
+            config = readconfig(self.path)
+            mainSection = config["main"]
+        except (OSError, KeyError, RuntimeError) as e:
+            if str(e) != self.error:
+                print(
+                    "[%s] Invalid setting file: %s" % (self.filename, e),
+                    file=sys.stderr,
+                )
+            self.error = str(e)
+            return
+        self.error = None
+
+        def abspath(fname):
+            return os.path.abspath(os.path.join(self.dirname, fname))
+
+        self.inputMap = (
+            abspath(mainSection["input"]) if "input" in mainSection else None
+        )
+        self.outputMap = (
+            abspath(mainSection["output"]) if "output" in mainSection else None
+        )
+        self.metricsPort = mainSection.get("metricsPort")
+
+        self.pluginPaths = set()
+        for pluginName in config:
+            if pluginName == "main":
+                continue
+            if pluginName[-3:] == ".py" or pluginName[-4:] == ".eps":
+                self.pluginPaths.add(abspath(pluginName))
+            else:
+                self.pluginPaths.add(os.path.abspath(getPluginPath(pluginName)))
+        self.pluginDependencies = getPluginDependencies(self.pluginPaths)
+
+    def getOutputFiles(self):
+        if self.outputMap is None:
+            return set()
+        return {
+            self.outputMap,
+            self.outputMap + ".epmap",
+            self.outputMap + ".epmap.prof",
+        }
+
+    def isAffectedBy(self, path):
+        return (
+            path == self.path
+            or path == self.inputMap
+            or path in self.pluginPaths
+            or isUnder(path, self.dirname)
+            or path in self.pluginDependencies
+            or any(isUnder(path, d) for d in self.pluginDependencies)
+        )
+
+
+def getAffectedTargets(targets, path):
+    # Outputs of every target are ignored, not just the target's own one.
+    # Otherwise two targets in one directory rebuild each other forever.
+    if any(path in t.getOutputFiles() for t in targets):
+        return []
+    return [t for t in targets if t.isAffectedBy(path)]
+
+
+class FileWatcher:
+    def __init__(self):
+        self.snapshot = {}
+
+    def scan(self, roots, files):
+        snapshot = {}
+        for root in roots:
+            for dirpath, dirs, fnames in os.walk(root):
+                dirs[:] = [d for d in dirs if d[0] != "." and d[0] != "_"]
+                for f in fnames:
+                    path = os.path.join(dirpath, f)
+                    if not isIgnoredFile(path):
+                        snapshot[path] = getFileTime(path)
+        for path in files:
+            snapshot[path] = getFileTime(path)
+        return snapshot
+
+    def poll(self, roots, files):
+        """Get paths of created, modified or removed files since last poll"""
+        snapshot = self.scan(roots, files)
+        changed = {
+            path
+            for path in snapshot.keys() | self.snapshot.keys()
+            if snapshot.get(path) != self.snapshot.get(path)
+        }
+        self.snapshot = snapshot
+        return changed
+
+
+class BuildJob:
+    def __init__(self, target, buildFunc, queuedTime, attempt=1):
+        self.target = target
+        self.queuedTime = queuedTime
+        self.attempt = attempt
+        self.events = []
+        self.queue = mp.Queue()
+        self.process = mp.Process(target=buildFunc, args=(target.path, self.queue))
+        self.process.start()
+
+    def poll(self):
+        """Collect events from the worker. Returns True when it has finished"""
+        while True:
+            try:
+                event = self.queue.get_nowait()
+            except Empty:
+                if self.process.is_alive():
+                    return False
+                # Worker died without reporting. Treat as a retryable failure.
+                event = {
+                    "event": "finished",
+                    "success": False,
+                    "retry": True,
+                    "time": time.time(),
+                }
+            self.events.append(event)
+            if event["event"] == "finished":
+                self.process.join()
+                return True
+
+
+def runDaemon(eddPaths, buildFunc, jobs=None):
+    targets = [BuildTarget(path) for path in eddPaths]
+    if jobs is None:
+        jobs = min(len(targets), os.cpu_count() or 1)
+    jobs = max(jobs, 1)
+    print(" - Watching %d target(s) with %d worker(s)" % (len(targets), jobs))
+
+    globalPluginDir = os.path.abspath(getGlobalPluginDirectory())
+    watcher = FileWatcher()
+    metrics = BuildMetrics()
+    metricsServer = None
+
+    pending = {}  # target -> queued time
+    running = {}  # target -> BuildJob
+
+    def getWatchList():
+        roots = []
+        for root in sorted({globalPluginDir} | {t.dirname for t in targets}):
+            if not any(isUnder(root, r) for r in roots):
+                roots.append(root)
+        files = {t.path for t in targets} | {t.inputMap for t in targets if t.inputMap}
+        files = [f for f in files if not any(isUnder(f, r) for r in roots)]
+        return roots, files
+
+    def scheduleChanges(changed, skippedTargets):
+        queuedTime = time.time()
+        for path in sorted(changed):
+            affected = [
+                t
+                for t in getAffectedTargets(targets, path)
+                if t not in skippedTargets
+            ]
+            if affected:
+                print("[File modified] %s" % path)
+            for target in affected:
+                pending.setdefault(target, queuedTime)
+
+    for target in targets:
+        target.reload()
+    watcher.poll(*getWatchList())
+    queuedTime = time.time()
+    for target in targets:
+        pending[target] = queuedTime
+
+    while True:
+        for target in targets:
+            target.reload()
+            if metricsServer is None and target.metricsPort:
+                metricsServer = startMetricsServer(metrics, int(target.metricsPort))
+
+        changed = watcher.poll(*getWatchList())
+        if changed:
+            # epscript can alter other files if some file changes.
+            # Wait 0.5 sec more for additional changes
+            while True:
+                time.sleep(0.5)
+                moreChanged = watcher.poll(*getWatchList())
+                if not moreChanged:
+                    break
+                changed |= moreChanged
+            # Files written by a running build belong to that build.
+            scheduleChanges(changed, set(running))
+
+        if msgbox.isWindows:
+            if msgbox.IsThisForeground() and msgbox.GetAsyncKeyState(ord("R")):
+                print("[Forced recompile issued]")
+                queuedTime = time.time()
+                for target in targets:
+                    pending.setdefault(target, queuedTime)
+
+        for target, job in list(running.items()):
+            if not job.poll():
+                continue
+            del running[target]
+            if job.events[-1]["retry"]:
+                print(
+                    "# Compile failed [%d/%d] %s"
+                    % (job.attempt, maxAttempts, target.filename),
+                    file=sys.stderr,
+                )
+                if job.attempt < maxAttempts:
+                    time.sleep(0.2)
+                    running[target] = BuildJob(
+                        target, buildFunc, job.queuedTime, job.attempt + 1
+                    )
+                    continue
+                print("Unexpected error!\n\n", file=sys.stderr)
+            else:
+                buildTime = sum(
+                    e["duration"] for e in job.events if e["event"] == "stageFinished"
+                )
+                print("Done! %s (%.2fs)\n\n" % (target.filename, buildTime))
+            metrics.addBuild(
+                summarizeBuild(target.filename, job.queuedTime, job.events, job.attempt)
+            )
+            # Absorb files written during the build
+            scheduleChanges(watcher.poll(*getWatchList()), set(running) | {target})
+
+        for target in list(pending):
+            if len(running) >= jobs:
+                break
+            if target in running:
+                continue
+            print(
+                "[[Updating %s on %s]]"
+                % (target.filename, time.strftime("%Y-%m-%d %H:%M:%S"))
+            )
+            running[target] = BuildJob(target, buildFunc, pending.pop(target))
+
+        time.sleep(0.2 if running else 1)
@@ -0,0 +1,49 @@
+import os
+import py_compile
+import shutil
+import sys
+
+
+def compileBundle(buildDir, dirnames=("plugins", "lib")):
+    """Precompile bundled plugins and libraries
+
+    Arguments:
+        buildDir {str} -- Build destination dir
+
+    Keyword Arguments:
+        dirnames {tuple} -- Directories under buildDir to compile
+
+    Returns:
+        int -- Number of compiled source files
+
+    Bytecode is hash-checked, so it is used only while its source is
+    unmodified. Run this with the same python version as the frozen build.
+    Only optimize=0 bytecode is made: plugins validate user settings with
+    assert, which higher levels strip.
+    """
+    count = 0
+    for dirname in dirnames:
+        for root, dirs, files in os.walk(os.path.join(buildDir, dirname)):
+            # Drop stale bytecode copied along from the source tree
+            if "__pycache__" in dirs:
+                shutil.rmtree(os.path.join(root, "__pycache__"))
+                dirs.remove("__pycache__")
+            for fname in files:
+                if not fname.endswith(".py"):
+                    continue
+                path = os.path.join(root, fname)
+                # Relative name keeps bytecode reproducible. Import system
+                # fixes code filenames on load.
+                py_compile.compile(
+                    path,
+                    dfile=os.path.relpath(path, buildDir),
+                    doraise=True,
+                    optimize=0,
+                    invalidation_mode=py_compile.PycInvalidationMode.CHECKED_HASH,
+                )
+                count += 1
+    return count
+
+
+if __name__ == "__main__":
+    print("Precompiled %d files" % compileBundle(sys.argv[1]))
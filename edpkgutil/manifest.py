@@ -0,0 +1,57 @@
+import hashlib
+import json
+import os
+
+
+def getFileDigest(fname):
+    """sha256 of a file. Shared by the packager and the updater"""
+    digest = hashlib.sha256()
+    with open(fname, "rb") as f:
+        for chunk in iter(lambda: f.read(0x10000), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def listFiles(buildDir):
+    """Sorted '/'-separated paths of files to package, relative to buildDir"""
+    files = []
+    for root, dirs, fnames in os.walk(buildDir):
+        for fname in fnames:
+            if fname.startswith("."):
+                continue
+            path = os.path.relpath(os.path.join(root, fname), buildDir)
+            files.append(path.replace(os.sep, "/"))
+    return sorted(files)
+
+
+def addPackage(manifest, fname, files=None):
+    """Record package fname in manifest
+
+    Manifest has 'version', 'files' (path -> sha256) and 'packages'
+    (package name -> {'sha256', 'size', 'files'}). Full package has no
+    'files' list as it contains every file.
+    """
+    package = {"sha256": getFileDigest(fname), "size": os.path.getsize(fname)}
+    if files is not None:
+        package["files"] = list(files)
+    manifest["packages"][os.path.basename(fname)] = package
+
+
+def getChangedFiles(oldManifest, newManifest):
+    """Files of newManifest which are added or modified since oldManifest"""
+    oldFiles = oldManifest["files"]
+    return sorted(
+        path
+        for path, digest in newManifest["files"].items()
+        if oldFiles.get(path) != digest
+    )
+
+
+def loadManifest(fname):
+    with open(fname, "r") as f:
+        return json.load(f)
+
+
+def saveManifest(manifest, fname):
+    with open(fname, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
@@ -1,22 +1,200 @@
+import hashlib
 import os
+import struct
 import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 
+from .manifest import listFiles
 
-def packageZip(buildDir, fname, version):
+# Every entry gets the same timestamp (1980-01-01 00:00:00) and attributes,
+# and entries are sorted, so the same build always makes the same zip.
+_dosTime = 0
+_dosDate = (0 << 9) | (1 << 5) | 1
+# Made by UNIX, so that external attributes hold a regular rw-r--r-- file
+_versionMadeBy = (3 << 8) | 20
+_externalAttr = 0o100644 << 16
+# Archive comment of zips written here. Entries of previous packages are
+# reused only if they have it, so every entry has the same compression.
+_zipComment = b"edpkgutil.packageZip 1"
+# No zip64 support: sizes, offsets and entry count must fit in the headers
+_maxSize = 0xFFFFFFFF
+_maxEntries = 0xFFFF
+
+
+class _Entry:
+    def __init__(self, name, method, crc, compressed, fileSize, digest):
+        self.name = name
+        self.method = method
+        self.crc = crc
+        self.compressed = compressed
+        self.fileSize = fileSize
+        self.digest = digest
+
+
+def _compress(name, data):
+    digest = hashlib.sha256(data).hexdigest()
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+    if len(compressed) >= len(data):
+        method, compressed = zipfile.ZIP_STORED, data
+    else:
+        method = zipfile.ZIP_DEFLATED
+    return _Entry(name, method, zlib.crc32(data), compressed, len(data), digest)
+
+
+def _readRawEntry(zipf, name, digest):
+    """Read compressed entry from zipf without decompressing it"""
+    info = zipf.getinfo(name)
+    if info.flag_bits & 0x1:  # encrypted
+        return None
+    zipf.fp.seek(info.header_offset)
+    header = zipf.fp.read(30)
+    if header[:4] != b"PK\x03\x04":
+        return None
+    nameLen, extraLen = struct.unpack("<2H", header[26:30])
+    zipf.fp.seek(nameLen + extraLen, os.SEEK_CUR)
+    compressed = zipf.fp.read(info.compress_size)
+    return _Entry(
+        name, info.compress_type, info.CRC, compressed, info.file_size, digest
+    )
+
+
+def _checkSize(name, size):
+    if size > _maxSize:
+        raise RuntimeError("%s is too large for a zip without zip64" % name)
+
+
+def _writeZip(fname, entries):
+    if len(entries) > _maxEntries:
+        raise RuntimeError("Too many files for a zip without zip64")
+    with open(fname, "wb") as f:
+        centralDir = []
+        for entry in entries:
+            _checkSize(entry.name, entry.fileSize)
+            _checkSize(entry.name, len(entry.compressed))
+            name = entry.name.encode("utf-8")
+            flags = 0 if entry.name.isascii() else 0x800
+            fields = (
+                flags,
+                entry.method,
+                _dosTime,
+                _dosDate,
+                entry.crc,
+                len(entry.compressed),
+                entry.fileSize,
+                len(name),
+            )
+            offset = f.tell()
+            _checkSize(fname, offset)
+            f.write(struct.pack("<4s5H3L2H", b"PK\x03\x04", 20, *fields, 0))
+            f.write(name)
+            f.write(entry.compressed)
+            centralDir.append(
+                struct.pack(
+                    "<4s6H3L5H2L",
+                    b"PK\x01\x02",
+                    _versionMadeBy,
+                    20,  # version needed to extract
+                    *fields,
+                    0,  # extra field length
+                    0,  # comment length
+                    0,  # disk number start
+                    0,  # internal attributes
+                    _externalAttr,
+                    offset,
+                )
+                + name
+            )
+
+        centralDirOffset = f.tell()
+        for record in centralDir:
+            f.write(record)
+        centralDirSize = f.tell() - centralDirOffset
+        _checkSize(fname, centralDirOffset + centralDirSize)
+        f.write(
+            struct.pack(
+                "<4s4H2LH",
+                b"PK\x05\x06",
+                0,
+                0,
+                len(entries),
+                len(entries),
+                centralDirSize,
+                centralDirOffset,
+                len(_zipComment),
+            )
+            + _zipComment
+        )
+
+
+def packageZip(buildDir, fname, version, files=None, previous=None, jobs=None):
     """Package zip
-    
+
     Arguments:
         buildDir {str} -- Build destination dir
         fname {str} -- Output .zip file
         version {str} -- Version of .zip file
+
+    Keyword Arguments:
+        files {list} -- '/'-separated paths to package (default: every file)
+        previous {tuple} -- (.zip file, manifest) of a previous package.
+            Its compressed entries are reused for files with the same hash,
+            if it was made by packageZip too.
+        jobs {int} -- Number of compression threads (default: cpu count)
+
+    Returns:
+        dict -- Per-file hash manifest of packaged files
     """
-    oldDir = os.getcwd()
-    with zipfile.ZipFile(fname, "w", zipfile.ZIP_DEFLATED) as zipf:
-        os.chdir(buildDir)
-        for root, dirs, files in os.walk("."):
-            for file in files:
-                if file.startswith("."):
-                    continue
-                zipf.write(os.path.join(root, file))
-        zipf.writestr("VERSION", str(version))
-        os.chdir(oldDir)
+    if files is None:
+        files = listFiles(buildDir)
+    files = sorted(files)
+
+    prevZip, prevFiles, prevNames = None, {}, set()
+    if previous is not None and os.path.exists(previous[0]):
+        prevZip = zipfile.ZipFile(previous[0], "r")
+        if prevZip.comment == _zipComment:
+            prevFiles = previous[1]["files"]
+            prevNames = set(prevZip.namelist())
+        else:
+            # Made by another zip writer, with other compression settings
+            prevZip.close()
+            prevZip = None
+
+    def readFile(path):
+        with open(os.path.join(buildDir, *path.split("/")), "rb") as f:
+            return f.read()
+
+    def makeEntry(path):
+        data = readFile(path)
+        digest = hashlib.sha256(data).hexdigest()
+        if prevFiles.get(path) == digest and path in prevNames:
+            return None, path, digest  # Reused below on the main thread
+        return _compress(path, data), path, digest
+
+    entries = []
+    reused = 0
+    try:
+        with ThreadPoolExecutor(jobs or os.cpu_count()) as executor:
+            for entry, path, digest in executor.map(makeEntry, files):
+                if entry is None:
+                    entry = _readRawEntry(prevZip, path, digest)
+                    if entry is None:
+                        entry = _compress(path, readFile(path))
+                    else:
+                        reused += 1
+                entries.append(entry)
+    finally:
+        if prevZip is not None:
+            prevZip.close()
+
+    entries.append(_compress("VERSION", str(version).encode("utf-8")))
+    _writeZip(fname, entries)
+    if reused:
+        print(" - Reused %d of %d entries from %s" % (reused, len(files), previous[0]))
+
+    return {
+        "version": version,
+        "files": {e.name: e.digest for e in entries[:-1]},
+        "packages": {},
+    }
@@ -0,0 +1,235 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2014 trgk
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+# Report of .epmap.prof runtime profiles made by epTrace.
+#
+# .epmap is written by eudplib. It has two header lines and one line per
+# trace key, whose location is 'file|function|line':
+#
+#   H0: 0123456789abcdef0123456789abcdef
+#   H1: 0123456789abcdef0123456789abcdef
+#    - 0000000A : C:\map\main.eps|onPluginStart|12
+#
+# .epmap.prof is written by epTrace. It lists every traced source file with
+# the number of samples taken on each line:
+#
+#   [File "C:\map\main.eps"]
+#   --------------------------------------------------
+#                 function onPluginStart() {
+#   [     42 ]        foo();
+#
+# Lines in any other format are errors, not skipped.
+#
+#   euddraft epmap report out.scx.epmap.prof [--map out.scx.epmap] [-n 30]
+#   euddraft epmap diff old.epmap.prof new.epmap.prof [-n 30]
+
+import argparse
+import re
+import sys
+from collections import Counter
+
+_headerRegex = re.compile(r"H[01]: [0-9A-Fa-f]{32}")
+_traceRegex = re.compile(r" - ([0-9A-F]{8}) : (.+)\|(.+)\|(\d+)")
+_fileRegex = re.compile(r'\[File "(.+)"\]')
+_countRegex = re.compile(r"\[ *(\d+) \]    ")
+_noCountPrefix = " " * 14
+_separator = "-" * 50
+
+
+def _readLines(fname):
+    with open(fname, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            yield lineno, line.rstrip("\r\n")
+
+
+def _formatError(fname, lineno, line):
+    return RuntimeError("%s:%d: Unrecognized line %r" % (fname, lineno, line))
+
+
+def parseEpmap(fname):
+    """trace key -> (file, function, line)"""
+    epmap = {}
+    for lineno, line in _readLines(fname):
+        match = _traceRegex.fullmatch(line)
+        if match:
+            key, file, func, sourceLine = match.groups()
+            epmap[int(key, 16)] = file, func, int(sourceLine)
+        elif line and not _headerRegex.fullmatch(line):
+            raise _formatError(fname, lineno, line)
+    return epmap
+
+
+def parseProfile(fname):
+    """(file, line) -> samples"""
+    profile = Counter()
+    file = None
+    for lineno, line in _readLines(fname):
+        match = _fileRegex.fullmatch(line)
+        if match:
+            file, sourceLine = match.group(1), 0
+            continue
+        if line == _separator:
+            continue
+        if file is None:
+            if line:
+                raise _formatError(fname, lineno, line)
+            continue
+        sourceLine += 1
+        match = _countRegex.match(line)
+        if match:
+            profile[file, sourceLine] += int(match.group(1))
+        elif line and not line.startswith(_noCountPrefix):
+            raise _formatError(fname, lineno, line)
+    return profile
+
+
+def getDisplayNames(files):
+    """file -> shortest trailing part of its path which is unique in files"""
+    parts = {file: re.split(r"[\\/]", file) for file in files}
+    names = {}
+    for file, fileParts in parts.items():
+        for n in range(1, len(fileParts) + 1):
+            name = "/".join(fileParts[-n:])
+            if all(
+                other == file or "/".join(otherParts[-n:]) != name
+                for other, otherParts in parts.items()
+            ):
+                break
+        names[file] = name
+    return names
+
+
+def getDefaultEpmap(profname):
+    if profname.endswith(".prof"):
+        return profname[:-5]
+    return profname + ".epmap"
+
+
+def aggregate(profile, epmap):
+    """Samples per function and per source line, keyed by full file path"""
+    lineFunctions = {}
+    for file, func, line in epmap.values():
+        lineFunctions.setdefault((file, line), func)
+    functions, lines = Counter(), Counter()
+    for (file, line), count in profile.items():
+        func = lineFunctions.get((file, line), "<unknown>")
+        functions[file, func] += count
+        lines[file, line, func] += count
+    return functions, lines
+
+
+def formatFunction(fname, func, names):
+    return "%s (%s)" % (func, names[fname])
+
+
+def loadProfile(profname, mapname=None):
+    profile = parseProfile(profname)
+    if mapname is None:
+        mapname = getDefaultEpmap(profname)
+    try:
+        epmap = parseEpmap(mapname)
+    except OSError:
+        print(
+            "[epmap] %s not found. Functions are unknown." % mapname,
+            file=sys.stderr,
+        )
+        epmap = {}
+    return aggregate(profile, epmap)
+
+
+def printReport(functions, lines, top):
+    total = sum(functions.values()) or 1
+    names = getDisplayNames({fname for fname, _ in functions})
+    print("Total samples: %d\n" % total)
+    print("Hottest functions")
+    for (fname, func), count in functions.most_common(top):
+        name = formatFunction(fname, func, names)
+        print("%12d %6.2f%%  %s" % (count, count * 100 / total, name))
+    print("\nHottest lines")
+    for (fname, line, func), count in lines.most_common(top):
+        name = "%s:%d (%s)" % (names[fname], line, func)
+        print("%12d %6.2f%%  %s" % (count, count * 100 / total, name))
+
+
+def printDiff(oldFunctions, newFunctions, top):
+    oldTotal = sum(oldFunctions.values())
+    newTotal = sum(newFunctions.values())
+    print(
+        "Total samples: %d -> %d (%+d)\n"
+        % (oldTotal, newTotal, newTotal - oldTotal)
+    )
+    deltas = [
+        (newFunctions[k] - oldFunctions[k], k)
+        for k in oldFunctions.keys() | newFunctions.keys()
+    ]
+    names = getDisplayNames({fname for _, (fname, _) in deltas})
+
+    def printDeltas(title, deltas):
+        print(title)
+        for delta, (fname, func) in deltas[:top]:
+            old, new = oldFunctions[fname, func], newFunctions[fname, func]
+            name = formatFunction(fname, func, names)
+            print("%+12d  %10d -> %-10d %s" % (delta, old, new, name))
+
+    deltas.sort(key=lambda x: (-x[0], str(x[1])))
+    printDeltas("More expensive", [d for d in deltas if d[0] > 0])
+    print()
+    printDeltas("Cheaper", [d for d in reversed(deltas) if d[0] < 0])
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="euddraft epmap")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    report = commands.add_parser("report", help="Rank hottest functions and lines")
+    report.add_argument("profile", help=".epmap.prof file")
+    report.add_argument("--map", help=".epmap file (default: next to profile)")
+    report.add_argument("-n", "--top", type=int, default=30)
+
+    diff = commands.add_parser("diff", help="Compare two profiles")
+    diff.add_argument("old", help="Old .epmap.prof file")
+    diff.add_argument("new", help="New .epmap.prof file")
+    diff.add_argument("--old-map", help="Old .epmap file")
+    diff.add_argument("--new-map", help="New .epmap file")
+    diff.add_argument("-n", "--top", type=int, default=30)
+
+    args = parser.parse_args(argv)
+    try:
+        if args.command == "report":
+            functions, lines = loadProfile(args.profile, args.map)
+            printReport(functions, lines, args.top)
+        else:
+            oldFunctions, _ = loadProfile(args.old, args.old_map)
+            newFunctions, _ = loadProfile(args.new, args.new_map)
+            printDiff(oldFunctions, newFunctions, args.top)
+    except (OSError, RuntimeError, UnicodeDecodeError) as e:
+        print("[epmap] %s" % e, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
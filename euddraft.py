@@ -24,17 +24,14 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
+import argparse
 import multiprocessing as mp
 import os
 import sys
-import time
-
-import eudplib as ep
 
 import autoupdate
+import buildevent
 import msgbox
-from pluginLoader import getGlobalPluginDirectory
-from readconfig import readconfig
 
 
 def applylib():
@@ -54,154 +51,135 @@ applylib()
 
 
 def applyEUDDraft(fname, queue=None):
+    buildevent.setEventQueue(queue)
     try:
         import applyeuddraft
 
         ret = applyeuddraft.applyEUDDraft(fname)
-        if queue:
-            queue.put(True)
+        buildevent.emit(
+            "finished", success=ret, retry=False, peakRSS=buildevent.getPeakRSS()
+        )
         return ret
     except ImportError as e:
         if queue:
-            if str(e).startswith("DLL load failed:"):
-                queue.put(False)
-            else:
-                queue.put(True)
+            retry = str(e).startswith("DLL load failed:")
+            buildevent.emit(
+                "finished",
+                success=False,
+                retry=retry,
+                peakRSS=buildevent.getPeakRSS(),
+            )
+            if not retry:
                 raise
         else:
             raise
 
 
-def isFileModified(path, since):
-    # Ignore profile things
-    if path.endswith(".epmap") or path.endswith(".epmap.prof"):
-        return False
-
-    try:
-        mtime = max(os.path.getmtime(path), os.path.getctime(path))
-        if mtime > since:
-            return True
-    except OSError:
-        pass
-    return False
-
-
-def hasModifiedFile(dirname, since):
-    ret = False
-    for root, dirs, files in os.walk(dirname):
-        dirs[:] = [d for d in dirs if d[0] != "." and d[0] != "_"]
-        for f in files:
-            finalpath = os.path.join(root, f)
-            if isFileModified(finalpath, since):
-                print("[File modified] %s" % finalpath)
-                ret = True
-    return ret
+def applyEUDDraftIn(eddPath, queue):
+    """Daemon worker. Build setting file eddPath from its directory"""
+    dirname, sfname = os.path.split(eddPath)
+    os.chdir(dirname)
+    sys.path.insert(0, dirname)
+    return applyEUDDraft(sfname, queue)
+
+
+def parseArgs():
+    parser = argparse.ArgumentParser(prog="euddraft")
+    parser.add_argument(
+        "files",
+        nargs="+",
+        metavar="setting file",
+        help=".eds/.edd setting file, several .edd files, or .scx map to protect",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of concurrent builds in daemon mode",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile .eds build. Writes <setting file>.trace.json and .collapsed.txt",
+    )
+    parser.add_argument(
+        "--no-update",
+        action="store_true",
+        help="Don't check for updates (same as EUDDRAFT_NO_UPDATE=1)",
+    )
+    return parser.parse_args()
 
 
 version = "0.9.5.0"
 
 
+# eudplib and applyeuddraft are imported only where they are needed. Daemon
+# parent process never compiles anything, so it shouldn't pay for them.
+# Run importtime_euddraft.py to check the startup cost of each mode.
+
 if __name__ == "__main__" or __name__ == "euddraft__main__":
     mp.freeze_support()
-    autoupdate.issueAutoUpdate()
+
+    # Subcommands
+    if len(sys.argv) > 1 and sys.argv[1] == "epmap":
+        import epmapreport
+
+        sys.exit(epmapreport.main(sys.argv[2:]))
 
     print("euddraft %s : Simple eudplib plugin system" % version)
     print(" - This program follows MIT License. See license.txt")
     if msgbox.isWindows:
         print(" - Press SHIFT to force check update while opening euddraft.")
 
-    if len(sys.argv) != 2:
-        raise RuntimeError("Usage : euddraft [setting file]")
+    args = parseArgs()
+    if len(args.files) > 1 and not all(f[-4:] == ".edd" for f in args.files):
+        raise RuntimeError("Usage : euddraft [setting file] or euddraft [.edd files]")
+    if args.profile and args.files[0][-4:] != ".eds":
+        raise RuntimeError("--profile only supports .eds setting file")
+    if not args.no_update:
+        autoupdate.issueAutoUpdate()
 
-    # Chdir to setting files
-    sfname = sys.argv[1]
+    # Chdir to setting files. Daemon handles each .edd from its own directory
+    sfname = args.files[0]
     oldpath = os.getcwd()
-    dirname, sfname = os.path.split(sfname)
-    if dirname:
-        os.chdir(dirname)
-        sys.path.insert(0, os.path.abspath(dirname))
+    if sfname[-4:] != ".edd":
+        dirname, sfname = os.path.split(sfname)
+        if dirname:
+            os.chdir(dirname)
+            sys.path.insert(0, os.path.abspath(dirname))
 
     # Use simple setting system
     if sfname[-4:] == ".eds":
-        if not applyEUDDraft(sfname):
+        if args.profile:
+            import buildprofiler
+
+            with buildprofiler.profile(sfname):
+                ret = applyEUDDraft(sfname)
+        else:
+            ret = applyEUDDraft(sfname)
+        if not ret:
             input("Press Enter to continue...")
 
     # Daemoning system
     elif sfname[-4:] == ".edd":
         print(" - Daemon mode. Ctrl+C to quit. R to recompile (windows only)\n\n")
         mp.set_start_method("spawn")
-        lasttime = None
-
-        globalPluginDir = getGlobalPluginDirectory()
+        import eddaemon
 
         try:
-            inputMap = None
-
-            def isModifiedFiles():
-                return (
-                    hasModifiedFile(globalPluginDir, lasttime)
-                    or hasModifiedFile(".", lasttime)
-                    or isFileModified(sfname, lasttime)
-                    or (inputMap and isFileModified(inputMap, lasttime))
-                )
-
-            while True:
-                # input map may change with edd update. We re-read inputMap
-                # every time here.
-                config = readconfig(sfname)
-                mainSection = config["main"]
-                inputMap = mainSection["input"]
-
-                # Wait for changes
-                while lasttime and not isModifiedFiles():
-                    if msgbox.isWindows:
-                        if msgbox.IsThisForeground() and msgbox.GetAsyncKeyState(
-                            ord("R")
-                        ):
-                            print("[Forced recompile issued]")
-                            break
-                    time.sleep(1)
-
-                # epscript can alter other files if some file changes.
-                # Wait 0.5 sec more for additional changes
-                while True:
-                    lasttime = time.time()
-                    time.sleep(0.5)
-                    if not isModifiedFiles():
-                        break
-
-                print("[[Updating on %s]]" % time.strftime("%Y-%m-%d %H:%M:%S"))
-
-                compileStatus = False
-                count = 0
-                while not compileStatus and count < 5:
-                    time.sleep(0.2)
-                    q = mp.Queue()
-                    p = mp.Process(target=applyEUDDraft, args=(sfname, q))
-                    p.start()
-                    compileStatus = q.get()
-                    p.join()
-                    count += 1
-                    if not compileStatus:
-                        print("# Compile failed [%d/%d]" % (count, 5), file=sys.stderr)
-
-                if count == 5:
-                    print("Unexpected error!\n\n", file=sys.stderr)
-                else:
-                    print("Done!\n\n")
-                lasttime = time.time()
-                time.sleep(1)
-
+            eddaemon.runDaemon(args.files, applyEUDDraftIn, args.jobs)
         except KeyboardInterrupt:
             pass
 
     # Freeze protection
     elif sfname[-4:].lower() == ".scx":
         print(" - Freeze protector mode.")
+        import eudplib as ep
+
         import applyeuddraft
         import freezeMpq
         import pluginLoader
-        import subprocess
 
         pluginLoader.freeze_enabled = True
 
@@ -0,0 +1,92 @@
+# Startup import cost of each euddraft entry mode.
+#
+# Runs a fresh interpreter with -X importtime for every mode and reports the
+# total import time with the most expensive top-level imports.
+#
+#   python importtime_euddraft.py [--repeat N] [--top N] [--json out.json]
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Modules each entry mode imports before it starts working.
+entryModes = {
+    "daemon": ["euddraft", "eddaemon"],
+    "eds": ["euddraft", "applyeuddraft"],
+    "scx": ["euddraft", "eudplib", "applyeuddraft"],
+}
+
+
+def parseImportTime(stderr):
+    """Returns [(module, self_us, cumulative_us, depth)] from -X importtime"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:") :].split("|")
+        if len(fields) != 3:
+            continue
+        try:
+            selfTime, cumulative = int(fields[0]), int(fields[1])
+        except ValueError:  # header line
+            continue
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2 - 1
+        imports.append((name.strip(), selfTime, cumulative, depth))
+    return imports
+
+
+def measureMode(modules, repeat):
+    basedir = os.path.dirname(os.path.abspath(__file__))
+    code = "; ".join("import %s" % m for m in modules)
+    best = None
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=basedir,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        if proc.returncode != 0:
+            return {"error": proc.stderr.strip().splitlines()[-1]}
+        imports = parseImportTime(proc.stderr)
+        total = sum(c for _, _, c, depth in imports if depth == 0)
+        if best is None or total < best[0]:
+            best = (total, imports)
+
+    total, imports = best
+    topLevel = sorted(
+        ((name, c) for name, _, c, depth in imports if depth == 0),
+        key=lambda x: -x[1],
+    )
+    return {"totalUs": total, "imports": topLevel}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    for mode, modules in entryModes.items():
+        result = measureMode(modules, args.repeat)
+        results[mode] = result
+        if "error" in result:
+            print("[%s] failed: %s" % (mode, result["error"]))
+            continue
+        print("[%s] %.1f ms" % (mode, result["totalUs"] / 1000))
+        for name, cumulative in result["imports"][: args.top]:
+            print("  %8.1f ms  %s" % (cumulative / 1000, name))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""msqcutil - Compile time arithmetic of the MSQC plugin.
+
+Plain python without eudplib, so that it can be checked on its own.
+"""
+import re
+from math import ceil
+
+# Frames per second on the fastest game speed
+FRAMES_PER_SECOND = 24
+
+
+def groupKeyOffsets(offsets):
+    """Key state offsets by dword: {offset of dword: sorted key offsets}.
+
+    Key states are bytes, so one dword compare covers up to 4 keys.
+    """
+    dwords = {}
+    for offset in offsets:
+        dwords.setdefault(offset - offset % 4, []).append(offset)
+    return {d: sorted(keys) for d, keys in dwords.items()}
+
+
+def keyMask(offsets):
+    """Mask of the lowest bit of each key state byte in their dword"""
+    return sum(256 ** (offset % 4) for offset in set(offsets))
+
+
+def parseSendOption(cond):
+    """('rate', n) for Rate(n), ('minDelta', n) for MinDelta(n), else None"""
+    match = re.fullmatch(r"(rate|mindelta)\(\s*(\d+)\s*\)", cond.strip().lower())
+    if match is None:
+        return None
+    name = "rate" if match.group(1) == "rate" else "minDelta"
+    return name, int(match.group(2))
+
+
+def sendInterval(rate):
+    """Frames between two sends for at most rate sends per second. 0: no limit"""
+    return ceil(FRAMES_PER_SECOND / rate) if rate else 0
+
+
+def minDeltaBounds(minDelta):
+    """(offset, limit) such that |x - last| >= minDelta is the unsigned
+    comparison x - last + offset >= limit.
+    """
+    return minDelta - 1, 2 * minDelta - 1
+
+
+def val32Layout(valBits):
+    """(seqBits, chunkBits, chunks) of a 32 bit value sent in valBits chunks.
+
+    Each chunk carries its index in the low seqBits bits and chunkBits bits
+    of the value above them.
+    """
+    seqBits = 1
+    while ceil(32 / (valBits - seqBits)) > 2 ** seqBits:
+        seqBits += 1
+        if seqBits >= valBits:
+            raise ValueError("%d bits are too few to send 32 bit values" % valBits)
+    chunkBits = valBits - seqBits
+    return seqBits, chunkBits, ceil(32 / chunkBits)
+
+
+def splitDispatch(pairs, tested=False):
+    """Next step of a binary dispatch over (ret, bit) pairs.
+
+    Returns one of
+        ('apply', ret) -- the only pair, whose bit is already known to be set
+        ('each', pairs) -- test the bit of each pair
+        ('split', [(mask, half), ...]) -- dispatch a half if any bit of its
+            mask is set
+    """
+    if len(pairs) == 1 and tested:
+        return "apply", pairs[0][0]
+    if len(pairs) <= 2:
+        return "each", pairs
+    mid = len(pairs) // 2
+    return "split", [
+        (sum(bit for _, bit in half), half) for half in (pairs[:mid], pairs[mid:])
+    ]
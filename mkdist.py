@@ -1,11 +1,14 @@
 #!/usr/bin/env python3
 
+import glob
 import os
 import runpy
 import shutil
 import sys
 
 from edpkgutil.cleanDir import cleanDirectory
+from edpkgutil.compileBundle import compileBundle
+from edpkgutil.manifest import addPackage, getChangedFiles, loadManifest, saveManifest
 from edpkgutil.packageZip import packageZip
 from euddraft import version
 
@@ -14,17 +17,53 @@ outputZipList = [
     "latest/euddraft%s.zip" % version,
     # 'latest/euddraft_latest.zip'
 ]
+manifestPath = "latest/euddraft%s.manifest.json" % version
+
+# Make delta packages from this many previous releases
+deltaCount = 3
 
 cleanDirectory(buildDir)
 
 if sys.platform.startswith("win"):
     runpy.run_module("setup")
+    print("Precompiled %d files" % compileBundle(buildDir))
 else:
     os.system("wine python setup.py")
     shutil.copy("python38.dll", os.path.join(buildDir, "python38.dll"))
+    # Bytecode must match the python frozen into euddraft
+    os.system("wine python -m edpkgutil.compileBundle %s" % buildDir)
+
+# Keep manifests and zips of released versions in latest/. Delta packages
+# are made from them, and unchanged files are not compressed again.
+oldManifests = [
+    loadManifest(fname)
+    for fname in glob.glob("latest/euddraft*.manifest.json")
+    if fname.replace("\\", "/") != manifestPath
+]
+oldManifests.sort(key=lambda m: [int(x) for x in m["version"].split(".")])
+previous = None
+if oldManifests:
+    lastManifest = oldManifests[-1]
+    previous = ("latest/euddraft%s.zip" % lastManifest["version"], lastManifest)
 
 for outputZipPath in outputZipList:
     print("Packaging to %s" % outputZipPath)
-    packageZip(buildDir, outputZipPath, version)
+    manifest = packageZip(buildDir, outputZipPath, version, previous=previous)
+fullZipPath = outputZipList[0]
+addPackage(manifest, fullZipPath)
+
+for oldManifest in oldManifests[-deltaCount:]:
+    changedFiles = getChangedFiles(oldManifest, manifest)
+    deltaZipPath = "latest/euddraft%s-from%s.zip" % (version, oldManifest["version"])
+    print("Packaging to %s (%d changed files)" % (deltaZipPath, len(changedFiles)))
+    packageZip(
+        buildDir,
+        deltaZipPath,
+        version,
+        files=changedFiles,
+        previous=(fullZipPath, manifest),
+    )
+    addPackage(manifest, deltaZipPath, changedFiles)
 
+saveManifest(manifest, manifestPath)
 open("latest/VERSION", "w").write(version)
@@ -0,0 +1,196 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (c) 2014 trgk
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+# Trigger statistics of plugin hooks, gathered while payloadMain is compiled.
+#
+# Every RawTrigger made while a hook runs is counted for that hook. Triggers
+# of beforeTriggerExec/afterTriggerExec sit in the main loop, so their sum is
+# an upper bound on the triggers the plugin runs each frame.
+#
+# Dead trigger report walks the triggers of each hook from its first trigger,
+# following next pointers and constant references. eudplib only emits objects
+# reachable from the payload root, so unreachable triggers (code after an
+# unconditional jump, ...) cost nothing and are listed for information.
+# Triggers guarded by Never() still take part in the trigger chain, and
+# their actions are the bytes possibly wasted. The report is an estimate
+# and never changes the payload: trigger contents are read from eudplib
+# internals, and references from Db blobs or EUDArray jump tables are not
+# seen, so self-modifying code may still toggle such a Never() condition.
+
+import warnings
+from contextlib import contextmanager
+
+import buildevent
+
+_trgCount = 0
+_currentHook = None  # triggers list of running hook
+_hookTriggers = []  # (plugin, hook, triggers) of every hook call
+_allTriggers = []  # every trigger made while counting
+
+loopHooks = ("beforeTriggerExec", "afterTriggerExec")
+
+NEVER_CONDTYPE = 23
+ACTION_SIZE = 32
+RLOCMODE_ADDRESS = 4
+
+
+@contextmanager
+def installCounter(ep):
+    """Count RawTriggers made until the context exits"""
+    rawTriggerInit = ep.RawTrigger.__init__
+
+    def __init__(self, *args, **kwargs):
+        global _trgCount
+        _trgCount += 1
+        rawTriggerInit(self, *args, **kwargs)
+        _allTriggers.append(self)
+        if _currentHook is not None:
+            _currentHook.append(self)
+
+    ep.RawTrigger.__init__ = __init__
+    try:
+        yield
+    finally:
+        ep.RawTrigger.__init__ = rawTriggerInit
+
+
+@contextmanager
+def countTriggers(plugin, hook):
+    global _currentHook
+    startCount = _trgCount
+    outerHook = _currentHook
+    _currentHook = []
+    try:
+        yield
+    finally:
+        _hookTriggers.append((plugin, hook, _currentHook))
+        _currentHook = outerHook
+        buildevent.emit(
+            "pluginTriggers", plugin=plugin, hook=hook, count=_trgCount - startCount
+        )
+
+
+# ----------------------------------------------------------------------------
+
+
+def _iterRefs(trigger):
+    """(object, offset, rlocmode) of constant references in trigger.
+
+    Raises AttributeError if RawTrigger internals of eudplib have changed.
+    """
+    values = [trigger._nextptr]
+    for item in list(trigger._conditions) + list(trigger._actions):
+        values.extend(item.fields)
+    for value in values:
+        # Resolve Forward
+        for _ in range(16):
+            expr = getattr(value, "_expr", None)
+            if expr is None:
+                break
+            value = expr
+        baseobj = getattr(value, "baseobj", None)
+        if baseobj is not None:
+            yield baseobj, getattr(value, "offset", 0), getattr(value, "rlocmode", 0)
+
+
+def _isNeverGuarded(trigger):
+    for cond in trigger._conditions:
+        fields = cond.fields
+        if len(fields) > 5 and fields[5] == NEVER_CONDTYPE:
+            return True
+    return False
+
+
+def findDeadTriggers():
+    """plugin -> {'triggers', 'unreachable', 'neverRun', 'wastedBytes'}"""
+    owner = {}
+    for plugin, hook, triggers in _hookTriggers:
+        for trigger in triggers:
+            owner.setdefault(trigger, plugin)
+
+    # References from triggers outside hooks count too
+    edges, dataRefs = {}, set()
+    for trigger in _allTriggers:
+        targets = edges.setdefault(trigger, [])
+        for obj, offset, rlocmode in _iterRefs(trigger):
+            if obj in owner:
+                targets.append(obj)
+                if offset != 0 or rlocmode != RLOCMODE_ADDRESS:
+                    dataRefs.add(obj)
+
+    reachable = set()
+    stack = [triggers[0] for _, _, triggers in _hookTriggers if triggers]
+    while stack:
+        trigger = stack.pop()
+        if trigger in reachable:
+            continue
+        reachable.add(trigger)
+        stack.extend(edges.get(trigger, ()))
+
+    report = {}
+    for trigger, plugin in owner.items():
+        stats = report.setdefault(
+            plugin,
+            {"triggers": 0, "unreachable": 0, "neverRun": [], "wastedBytes": 0},
+        )
+        stats["triggers"] += 1
+        if trigger not in reachable:
+            stats["unreachable"] += 1
+        elif _isNeverGuarded(trigger) and trigger not in dataRefs:
+            actions = trigger._actions
+            if actions:
+                stats["neverRun"].append(trigger)
+                stats["wastedBytes"] += ACTION_SIZE * len(actions)
+    return report
+
+
+def reportDeadTriggers():
+    try:
+        report = findDeadTriggers()
+    except AttributeError as e:
+        warnings.warn(
+            "Dead trigger report is disabled: unsupported eudplib internals (%s)" % e
+        )
+        return
+    print("[deadTriggers] plugin: triggers / unreachable / never run (wasted bytes)")
+    for plugin, stats in report.items():
+        print(
+            "  %s: %d / %d / %d (%d bytes)"
+            % (
+                plugin,
+                stats["triggers"],
+                stats["unreachable"],
+                len(stats["neverRun"]),
+                stats["wastedBytes"],
+            )
+        )
+        buildevent.emit(
+            "deadTriggers",
+            plugin=plugin,
+            triggers=stats["triggers"],
+            unreachable=stats["unreachable"],
+            neverRun=len(stats["neverRun"]),
+            wastedBytes=stats["wastedBytes"],
+        )
@@ -25,9 +25,17 @@ THE SOFTWARE.
 
 import os
 import sys
+import time
 import types
 from importlib.machinery import SourceFileLoader
 
+import buildevent
+
+# Plugin interface features of this euddraft. Plugins check these to stay
+# compatible with older versions instead of importing euddraft internals.
+#  eventHooks : eventHooks dict with chat, mouse, keyboard and players events
+pluginFeatures = frozenset(["eventHooks"])
+
 # Get absolute path of current executable
 if getattr(sys, "frozen", False):
     # frozen
@@ -138,6 +146,7 @@ def loadPluginsFromConfig(ep, config):
 
         # real python name
         pluginPath = getPluginPath(pluginName)
+        loadStartTime = time.perf_counter()
 
         try:
             pluginDir = os.path.dirname(pluginPath)
@@ -151,6 +160,8 @@ def loadPluginsFromConfig(ep, config):
             if pluginPath.endswith(".eps"):
                 loader = ep.EPSLoader(moduleName, pluginPath)
             else:
+                # Uses hash-checked bytecode of bundled plugins made by
+                # edpkgutil.compileBundle while their source is unmodified.
                 loader = SourceFileLoader(moduleName, pluginPath)
 
             pluginModule.__name__ = moduleName
@@ -165,12 +176,22 @@ def loadPluginsFromConfig(ep, config):
                 onPluginStart = pluginDict.get("onPluginStart", empty)
                 beforeTriggerExec = pluginDict.get("beforeTriggerExec", empty)
                 afterTriggerExec = pluginDict.get("afterTriggerExec", empty)
+                # event -> function, called only on frames the event occurs
+                eventHooks = pluginDict.get("eventHooks", {})
                 pluginFuncDict[pluginName] = (
                     onPluginStart,
                     beforeTriggerExec,
                     afterTriggerExec,
+                    eventHooks,
                 )
 
+            buildevent.emit(
+                "pluginLoaded",
+                plugin=pluginName,
+                path=pluginPath,
+                duration=time.perf_counter() - loadStartTime,
+            )
+
         except (KeyboardInterrupt, SystemExit):
             raise
 
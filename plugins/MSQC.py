@@ -6,17 +6,35 @@ from math import ceil
 
 from eudplib import *
 
+import pluginLoader
+from msqcutil import (
+    groupKeyOffsets,
+    keyMask,
+    minDeltaBounds,
+    parseSendOption,
+    sendInterval,
+    splitDispatch,
+    val32Layout,
+)
+
 # Default: Valkyrie, Location 1, P11
 # fmt: off
 QCUnit, QCLoc, QCPlayer = 58, 0, 10
 QCX, QCY = 128, 128  # (4, 4)
-QCDebug, UseVal = True, False
+QCDebug, QCDebugInterval, UseVal = True, 1, False
+QCEncoding, packedX = "bits", None
+QCRate, QCMinDelta = 0, 0  # Default Rate(n) of xy_rets, MinDelta(n) of mouse
 qc_cons, qc_rets, xy_cons, xy_rets, deathsUnits = [], [], [], [], set()
+xy_opts = []  # {'rate', 'interval', 'cooldown', 'minDelta', 'last'} of xy_rets
 
 KeyArray, KeyOffset = EUDArray(8), set()
 MouseArray, MouseOffset = EUDArray(1), set()
 cmpScreenX, cmpMouseX, cmpScreenY, cmpMouseY = [Forward() for i in range(4)]
 isMouseMoved, useMouseLocation = EUDVariable(), False
+# SendQC is skipped on frames without any new input if every binding needs
+# a key/mouse edge or mouse movement.
+isInputChanged, useInputCheck = EUDVariable(), True
+inputKeyCmps, inputMouseCmp = {}, [None, 0]  # dword -> (cmp, offsets); cmp, mask
 
 MouseButtonDict = {"L": 2, "LEFT": 2, "R": 8, "RIGHT": 8, "M": 32, "MIDDLE": 32}
 KeyCodeDict = {
@@ -114,24 +132,44 @@ def RegisterMouseOffset(k):
 
 
 def KeyUpdate():
-    for offset in KeyOffset:
-        r = offset % 4
-        m = 256 ** r
-        n = 2 ** (offset % 32)
-        RawTrigger(
-            conditions=[  # KeyDown
-                MemoryX(0x596A18 + offset - r, Exactly, m, m),
-                MemoryX(KeyArray + offset // 8, Exactly, 0, n),
-            ],
-            actions=SetMemoryX(KeyArray + offset // 8, SetTo, n, n),
-        )
+    # Keys are compared against their last known state a dword (4 keys) at a
+    # time, 16 dwords per trigger. Only when some key in the group changed,
+    # KeyArray and the compare conditions are updated key by key.
+    keyDwords = groupKeyOffsets(KeyOffset)
+    dwords = sorted(keyDwords)
+    keyChanged = EUDVariable()
+    for i in range(0, len(dwords), 16):
+        group = [(Forward(), d) for d in dwords[i : i + 16]]
+        keyChanged << 1
         RawTrigger(
-            conditions=[  # KeyUp
-                MemoryX(0x596A18 + offset - r, Exactly, 0, m),
-                MemoryX(KeyArray + offset // 8, Exactly, n, n),
+            conditions=[
+                cmp << MemoryX(0x596A18 + d, Exactly, 0, keyMask(keyDwords[d]))
+                for cmp, d in group
             ],
-            actions=SetMemoryX(KeyArray + offset // 8, SetTo, 0, n),
+            actions=keyChanged.SetNumber(0),
         )
+        if EUDIf()(keyChanged == 1):
+            for cmp, d in group:
+                inputCmp, inputOffsets = inputKeyCmps.get(d, (None, ()))
+                for offset in keyDwords[d]:
+                    m = 256 ** (offset % 4)
+                    n = 2 ** (offset % 32)
+                    cmps = [cmp, inputCmp] if offset in inputOffsets else [cmp]
+                    RawTrigger(
+                        conditions=MemoryX(0x596A18 + d, Exactly, m, m),
+                        actions=[  # KeyDown
+                            SetMemoryX(KeyArray + offset // 8, SetTo, n, n),
+                            [SetMemoryX(c + 8, SetTo, m, m) for c in cmps],
+                        ],
+                    )
+                    RawTrigger(
+                        conditions=MemoryX(0x596A18 + d, Exactly, 0, m),
+                        actions=[  # KeyUp
+                            SetMemoryX(KeyArray + offset // 8, SetTo, 0, n),
+                            [SetMemoryX(c + 8, SetTo, 0, m) for c in cmps],
+                        ],
+                    )
+        EUDEndIf()
 
 
 def KeyDown(k):
@@ -178,20 +216,28 @@ def KeyPress(k):
 
 
 def MouseUpdate():
+    inputCmp, inputMask = inputMouseCmp
     for k in MouseOffset:
+        cmps = [inputCmp] if k & inputMask else []
         RawTrigger(
             conditions=[  # MouseDown
                 MemoryX(0x6CDDC0, Exactly, k, k),
                 MemoryX(MouseArray, Exactly, 0, k),
             ],
-            actions=SetMemoryX(MouseArray, SetTo, k, k),
+            actions=[
+                SetMemoryX(MouseArray, SetTo, k, k),
+                [SetMemoryX(c + 8, SetTo, k, k) for c in cmps],
+            ],
         )
         RawTrigger(
             conditions=[  # MouseUp
                 MemoryX(0x6CDDC0, Exactly, 0, k),
                 MemoryX(MouseArray, Exactly, k, k),
             ],
-            actions=SetMemoryX(MouseArray, SetTo, 0, k),
+            actions=[
+                SetMemoryX(MouseArray, SetTo, 0, k),
+                [SetMemoryX(c + 8, SetTo, 0, k) for c in cmps],
+            ],
         )
 
 
@@ -253,12 +299,61 @@ def MouseMoved():
     return isMouseMoved.Exactly(1)
 
 
+def _IsInputChanged():
+    # Compare registered keys and mouse buttons against KeyArray/MouseArray.
+    # KeyUpdate and MouseUpdate keep amounts of these conditions in sync.
+    conditions = []
+    for d, offsets in sorted(groupKeyOffsets(KeyOffset).items()):
+        cmp = Forward()
+        inputKeyCmps[d] = (cmp, offsets)
+        conditions.append(cmp << MemoryX(0x596A18 + d, Exactly, 0, keyMask(offsets)))
+    if MouseOffset:
+        cmp, mask = Forward(), sum(MouseOffset)
+        inputMouseCmp[:] = cmp, mask
+        conditions.append(cmp << MemoryX(0x6CDDC0, Exactly, 0, mask))
+
+    chunks = [conditions[i : i + 16] for i in range(0, len(conditions), 16)]
+    isInputChanged << len(chunks)
+    for chunk in chunks:
+        RawTrigger(conditions=chunk, actions=isInputChanged.SubtractNumber(1))
+    if useMouseLocation:
+        RawTrigger(
+            conditions=isMouseMoved.Exactly(1), actions=isInputChanged.SetNumber(1)
+        )
+    for opts in xy_opts:
+        if "transfer" in opts:  # Remaining chunks of val32 are sent regardless
+            RawTrigger(
+                conditions=opts["transfer"].AtLeast(1),
+                actions=isInputChanged.SetNumber(1),
+            )
+
+
+def _Val32Payload(opts, src):
+    # Latch the value on the first chunk, then send chunk i as
+    # i + (bits of chunk i << seqBits). Returns EPD of the payload.
+    transfer, latched, payload = opts["transfer"], opts["latched"], opts["payload"]
+    chunkBits, seqBits = opts["chunkBits"], opts["seqBits"]
+    if EUDIf()(transfer == 0):
+        latched << f_dwread_epd(src)
+    EUDEndIf()
+    for c in range(opts["chunks"]):
+        if EUDIf()(transfer == c):
+            chunk = f_bitrshift(latched, chunkBits * c) if c else latched
+            payload << (chunk & (2 ** chunkBits - 1)) * 2 ** seqBits + c
+        EUDEndIf()
+    RawTrigger(actions=transfer.AddNumber(1))
+    RawTrigger(
+        conditions=transfer.Exactly(opts["chunks"]), actions=transfer.SetNumber(0)
+    )
+    return EPD(payload.getValueAddr())
+
+
 def onInit():
     sys.stdout.reconfigure(encoding="utf-8")
     # get map size & human player
     chkt = GetChkTokenized()
     dim, ownr = chkt.getsection("DIM"), chkt.getsection("OWNR")
-    global bit_xy, map_x, map_y
+    global bit_xy, bit_qc, map_x, map_y
     dim_x, dim_y = b2i2(dim[0:2]), b2i2(dim[2:4])
     bit_x, bit_y = dim_x.bit_length() + 2, dim_y.bit_length() + 18
     bit_xy = [2 ** y for y in range(bit_y, 15, -1)] + [
@@ -266,8 +361,10 @@ def onInit():
     ]
     map_x, map_y = (dim_x - 1).bit_length() + 4, (dim_y - 1).bit_length() + 4
 
-    global humans, QCUnit, QCLoc, QCPlayer, QCX, QCY, QCDebug
-    global qc_cons, qc_rets, xy_cons, xy_rets, QCCount, UseVal
+    global humans, QCUnit, QCLoc, QCPlayer, QCX, QCY, QCDebug, QCEncoding, packedX
+    global QCDebugInterval
+    global qc_cons, qc_rets, xy_cons, xy_rets, QCCount, UseVal, useInputCheck
+    global QCRate, QCMinDelta
     humans = [p for p in range(8) if ownr[p] == 6]
 
     # simple parsing settings
@@ -310,8 +407,32 @@ def onInit():
                 except ValueError:
                     raise EPError("QCDebug should be True/False or non-zero, 0.")
             continue
+        elif k == "QCDebugInterval":
+            try:
+                QCDebugInterval = int(v, 0)
+            except ValueError:
+                raise EPError("QCDebugInterval should be a number.")
+            ep_assert(QCDebugInterval >= 1, "QCDebugInterval should be 1 or more.")
+            continue
+        elif k == "QCRate" or k == "QCMinDelta":
+            try:
+                n = int(v, 0)
+            except ValueError:
+                raise EPError("%s should be a number." % k)
+            if k == "QCRate":
+                QCRate = n
+            else:
+                QCMinDelta = n
+            continue
+        elif k == "QCEncoding":
+            QCEncoding = v.strip().lower()
+            if QCEncoding not in ("bits", "packed"):
+                raise EPError("QCEncoding should be bits or packed.")
+            continue
 
         con_final, ret_final = [], None
+        hasEdge, hasCustom = False, False
+        rate, minDelta = None, None
 
         # parse conditions
         con_count = 0
@@ -326,6 +447,7 @@ def onInit():
                     except ValueError:
                         raise EPError("MouseLocation should be location or index.")
                 con_final.append(MouseMoved())
+                hasEdge = True
                 global useMouseLocation
                 useMouseLocation = True
                 mouse_loc -= min(humans)
@@ -334,31 +456,43 @@ def onInit():
             elif cond[:8] == "KeyDown(" and cond[-1] == ")":
                 RegisterKeyOffset(cond[8:-1])
                 con_final.append(KeyDown(cond[8:-1]))
+                hasEdge = True
             elif cond[:6] == "KeyUp(" and cond[-1] == ")":
                 RegisterKeyOffset(cond[6:-1])
                 con_final.append(KeyUp(cond[6:-1]))
+                hasEdge = True
             elif cond[:9] == "KeyPress(" and cond[-1] == ")":
                 con_final.append(KeyPress(cond[9:-1]))
             elif cond.upper() in KeyCodeDict:
                 RegisterKeyOffset(cond)
                 con_final.append(KeyDown(cond))
+                hasEdge = True
 
             elif cond[:10] == "MouseDown(" and cond[-1] == ")":
                 RegisterMouseOffset(cond[10:-1])
                 con_final.append(MouseDown(cond[10:-1]))
+                hasEdge = True
             elif cond[:8] == "MouseUp(" and cond[-1] == ")":
                 RegisterMouseOffset(cond[8:-1])
                 con_final.append(MouseUp(cond[8:-1]))
+                hasEdge = True
             elif cond[:11] == "MousePress(" and cond[-1] == ")":
                 con_final.append(MousePress(cond[11:-1]))
 
             elif cond.lower() == "nottyping":
                 con_final.append(NotTyping())
 
+            elif parseSendOption(cond):
+                name, n = parseSendOption(cond)
+                if name == "rate":
+                    rate = n
+                else:
+                    minDelta = n
+
             else:
                 c = [con.strip() for con in cond.split(",")]
-                if c[0].lower() == "val":
-                    UseVal = True
+                if c[0].lower() == "val" or c[0].lower() == "val32":
+                    UseVal = UseVal or c[0].lower() == "val"
                     _c, deaths_unit = c[1], v.strip()
                     try:
                         _c = EPD(int(_c, 0))
@@ -375,7 +509,7 @@ def onInit():
                             deathsUnits.add(deaths_unit)
                     else:
                         deathsUnits.add(deaths_unit)
-                    ret_final = ["val", _c, deaths_unit]
+                    ret_final = [c[0].lower(), _c, deaths_unit]
                 elif c[0].lower() == "xy":
                     ret = [r.strip() for r in v.split(",")]
                     if not 1 <= len(ret) <= 2:
@@ -414,8 +548,12 @@ def onInit():
                         con_final.append(Memory(ptr, mod, val))
                 else:
                     con_final.append(cond)
+                    hasCustom = True
 
         ep_assert(len(con_final) >= 1, "At least 1 condition is needed.")
+        # Custom conditions may register more keys while SendQC is compiled
+        if not hasEdge or hasCustom:
+            useInputCheck = False
 
         # parse returns
         if ret_final is None:
@@ -438,14 +576,66 @@ def onInit():
             else:
                 deathsUnits.add(death_unit)
                 ret_final = ["deaths", death_unit, increment]
+            if rate is not None or minDelta is not None:
+                raise EPError("Rate() and MinDelta() are for mouse, xy, val only.")
             qc_cons.append(con_final)
             qc_rets.append(ret_final)
         else:
+            if minDelta is not None and ret_final[0] in ("xy", "val32"):
+                raise EPError("MinDelta() is for mouse and val only.")
             xy_cons.append(con_final)
             xy_rets.append(ret_final)
+            xy_opts.append({"rate": rate, "minDelta": minDelta})
+
+    # Rate(n): at most n sends per second (24 frames on fastest speed).
+    # While cooling down, mouse bindings keep the latest position to send.
+    # MinDelta(n): skip sends until the value moves by n or more.
+    for ret, opts in zip(xy_rets, xy_opts):
+        if opts["rate"] is None:
+            opts["rate"] = QCRate
+        opts["interval"] = sendInterval(opts["rate"])
+        opts["cooldown"] = EUDVariable() if opts["interval"] >= 2 else None
+        if opts["minDelta"] is None:
+            opts["minDelta"] = QCMinDelta if ret[0] == "mouse" else 0
+        if ret[0] == "mouse":
+            opts["last"] = (EUDVariable(), EUDVariable())
+        else:
+            opts["last"] = EUDVariable()
+        if ret[0] == "val32":
+            # val32: 32 bit value split to chunks sent on consecutive frames.
+            # Each chunk carries its index in low seqBits bits.
+            opts["seqBits"], opts["chunkBits"], opts["chunks"] = val32Layout(
+                map_x + map_y
+            )
+            opts["transfer"] = EUDVariable()  # index of chunk to send
+            opts["latched"], opts["payload"] = EUDVariable(), EUDVariable()
+            opts["acc"] = EUDArray(8)  # value being reassembled per player
+            print(
+                "[MSQC] val32 {}: {} frames per value "
+                "({} bits + {} sequence bits each)".format(
+                    ret[1], opts["chunks"], opts["chunkBits"], opts["seqBits"]
+                )
+            )
 
-    QCCount = len(xy_rets) + ceil(len(qc_rets) / len(bit_xy))
+    # packed: waypoint of a QC unit is a mixed radix number (x, y) holding
+    # floor(log2(X * Y)) bits instead of one bit per power of two coordinate.
+    packX, packY = dim_x * 32 - 128, dim_y * 32 - 128
+    bit_packed = [2 ** i for i in range((packX * packY).bit_length() - 1)]
+    if QCEncoding == "packed":
+        bit_qc, packedX = bit_packed, packX
+    else:
+        bit_qc = bit_xy
+    QCCount = len(xy_rets) + ceil(len(qc_rets) / len(bit_qc))
     ep_assert(QCCount >= 1, "Must add desync cond : sync return pair")
+    if qc_rets:
+        bitsCount = len(xy_rets) + ceil(len(qc_rets) / len(bit_xy))
+        packedCount = len(xy_rets) + ceil(len(qc_rets) / len(bit_packed))
+        print(
+            "[MSQC] QCEncoding: {} bits/QCUnit (bits) -> {} bits/QCUnit (packed), "
+            "up to {} -> {} commands per frame".format(
+                len(bit_xy), len(bit_packed), 2 * bitsCount, 2 * packedCount
+            )
+        )
     print(
         "[MSQC] map size: {}x{}, {} men x {} QCUnits (ID: {})".format(
             dim_x, dim_y, len(humans), QCCount, QCUnit
@@ -478,6 +668,8 @@ def onInit():
         print("MouseLoc=%s" % ", ".join(loc_list))
     if QCDebug:
         print("QCDebug enabled. You can disable it by writing 'QCDebug: false'.")
+        if QCDebugInterval >= 2:
+            print("QC units are checked every %d frames." % QCDebugInterval)
 
 
 onInit()
@@ -492,9 +684,15 @@ ArrayEPDs = PVariable([EPD(x) for x in QC_EPDs])
 MyQCptrs = [Forward() for _ in range(QCCount)]
 # used in SendQC::QGC_Select
 MyQCalphaids = [Forward() for _ in range(QCCount)]
+# Dword at SendQC::QGC + 4 for a QC unit of alpha id 0: select count 1 and
+# RightClick opcode. Respawn adds the real alpha id.
+QGC_Select = 0x14000001
 cp = EUDVariable()
 if QCDebug:
     QCShutdown = EUDLightVariable()
+    # Frames until next QC unit check. ReceiveQC forces the check when it
+    # meets a removed QC unit.
+    QCDebugTimer, QCDebugForced = EUDVariable(), EUDLightVariable()
 f_mapXread_epd = f_readgen_epd(2 ** (map_x + 1) - 1, (0, lambda x: x))
 f_mapYread_epd = f_readgen_epd(
     2 ** (map_y + 1) - 1, (0, lambda y: y << 16), (0, lambda y: y)
@@ -513,16 +711,43 @@ if UseVal:
     print("Sendable value range for 'val' syntax: 0 to {}".format(valMask))
 
 
+# Humans still in game. Rebuilt on start and when f_playerexist of any
+# player changes, instead of checking it on every iteration of every loop.
+HumanTable, HumanCount = EUDArray(8), EUDVariable()
+
+# Older euddraft ignores plugin eventHooks, so the table is rebuilt every
+# frame there.
+useEventHooks = "eventHooks" in getattr(pluginLoader, "pluginFeatures", ())
+
+
+@EUDFunc
+def UpdateHumanTable():
+    global HumanCount
+    HumanCount << 0
+    for p in humans:
+        if EUDIf()(f_playerexist(p)):
+            HumanTable[HumanCount] = p
+            HumanCount += 1
+        EUDEndIf()
+
+
+if useEventHooks:
+    eventHooks = {"players": UpdateHumanTable}
+
+
 def EUDHumanLoop():
     def _footer():
-        block = {"origcp": f_getcurpl()}
-
-        minp, maxp = min(humans), max(humans)
-        EUDWhile()(cp.AtMost(maxp))
-        for p in range(minp, maxp):
-            if p not in humans:
-                EUDContinueIf(cp.Exactly(p))
-        EUDContinueIfNot(f_playerexist(cp))
+        humanIndex, humansLeft = EUDVariable(), EUDVariable()
+        block = {
+            "origcp": f_getcurpl(),
+            "humanIndex": humanIndex,
+            "humansLeft": humansLeft,
+        }
+
+        humanIndex << 0
+        humansLeft << HumanCount
+        EUDWhile()(humansLeft.AtLeast(1))
+        cp << HumanTable[humanIndex]
         f_setcurpl(cp)
 
         EUDCreateBlock("hloopblock", block)
@@ -534,9 +759,11 @@ def EUDHumanLoop():
 def EUDEndHumanLoop():
     block = EUDPopBlock("hloopblock")[1]
     origcp = block["origcp"]
+    humanIndex, humansLeft = block["humanIndex"], block["humansLeft"]
 
     if not EUDIsContinuePointSet():
         EUDSetContinuePoint()
+    DoActions([humanIndex.AddNumber(1), humansLeft.SubtractNumber(1)])
 
     EUDEndWhile()
     f_setcurpl(origcp)
@@ -559,6 +786,7 @@ vr = EUDVArrayReader()
 
 
 def onPluginStart():
+    UpdateHumanTable()
     Respawn()
 
 
@@ -598,7 +826,6 @@ def Respawn():
             SetMemory(LOC_TEMP + 12, SetTo, f_dwread_epd(LocEPD + 3)),
             SetMemory(LOC_TEMP + 16, SetTo, f_dwread_epd(LocEPD + 4)),
             SetMemoryXEPD(LocEPD + 4, SetTo, 0, 0xFFFF0000),
-            cp.SetNumber(min(humans)),
         ]
     )
     EUDHumanLoop()()
@@ -674,7 +901,8 @@ def Respawn():
             MyQCalphaidsArray = EUDArray([EPD(t) + 5 for t in MyQCalphaids])
             SetMyQC = Forward()
             myQCptr, myQCalphaID = MyQCptrsArray[i], MyQCalphaidsArray[i]
-            alphaID = f_epd2alphaid(epd)
+            # SendQC::QGC + 4 holds select count, unit id and RightClick opcode
+            alphaID = f_epd2alphaid(epd) * 256 + QGC_Select
 
             VProc(
                 [myQCptr, myQCalphaID, ptr, alphaID],
@@ -695,8 +923,6 @@ def Respawn():
         EUDSetContinuePoint()
         DoActions([i.AddNumber(1), arrayEPD.AddNumber(18)])
     EUDEndWhile()
-    EUDSetContinuePoint()
-    cp += 1
     EUDEndHumanLoop()
 
     DoActions(
@@ -730,7 +956,6 @@ def eqsplit(iterable, eqr):
 @EUDFunc
 def KillQCUnits():
     global cp
-    cp << min(humans)
     EUDHumanLoop()()
     arrayPtr = ArrayPTRs[cp]
     arrayEPD = ArrayEPDs[cp]
@@ -741,18 +966,40 @@ def KillQCUnits():
         EUDContinueIf(MemoryEPD(qc_epd + 0xC // 4, Exactly, 0))
         DoActions(SetMemoryXEPD(qc_epd + 0x110 // 4, SetTo, 1, 0xFFFF))
     EUDEndWhile()
-    EUDSetContinuePoint()
-    cp += 1
     EUDEndHumanLoop()
 
 
 def DebugQC():
     if not QCDebug:
         return
+    if QCDebugInterval == 1:
+        _DebugQCSweep()
+        return
+    if EUDIf()([QCDebugTimer.AtLeast(1), QCDebugForced.Exactly(0)]):
+        DoActions(QCDebugTimer.SubtractNumber(1))
+    if EUDElse()():
+        DoActions(
+            [
+                QCDebugTimer.SetNumber(QCDebugInterval - 1),
+                QCDebugForced.SetNumber(0),
+            ]
+        )
+        _DebugQCSweep()
+    EUDEndIf()
+
+
+def _CheckQCUnitRemoved():
+    if QCDebug and QCDebugInterval >= 2:
+        RawTrigger(
+            conditions=MemoryEPD(qc_epd + 0xC // 4, Exactly, 0),
+            actions=QCDebugForced.SetNumber(1),
+        )
+
+
+def _DebugQCSweep():
     something_bad_happend, fin = Forward(), Forward()
     err_type = EUDLightVariable()
     global cp
-    cp << min(humans)
     EUDHumanLoop()()
     arrayPtr = ArrayPTRs[cp]
     arrayEPD = ArrayEPDs[cp]
@@ -788,13 +1035,10 @@ def DebugQC():
             RawTrigger(nextptr=something_bad_happend, actions=err_type.SetNumber(3))
         EUDEndIf()
     EUDEndWhile()
-    EUDSetContinuePoint()
-    cp += 1
     EUDEndHumanLoop()
 
     PushTriggerScope()
     something_bad_happend << NextTrigger()
-    cp << min(humans)
     if EUDHumanLoop()():
         DoActions(
             [
@@ -813,13 +1057,11 @@ def DebugQC():
             conditions=err_type.Exactly(3),
             actions=DisplayText("\x13Player isn't equal"),
         )
-        EUDSetContinuePoint()
-        cp += 1
     EUDEndHumanLoop()
     KillQCUnits()
     if EUDIf()(Respawn() == -1):
         KillQCUnits()
-        DoActions([cp.SetNumber(min(humans)), QCShutdown.SetNumber(60 * 23)])
+        DoActions(QCShutdown.SetNumber(60 * 23))
         if EUDHumanLoop()():
             DoActions(
                 [
@@ -829,8 +1071,6 @@ def DebugQC():
                     )
                 ]
             )
-            EUDSetContinuePoint()
-            cp += 1
         EUDEndHumanLoop()
     EUDEndIf()
     EUDJump(fin)
@@ -848,6 +1088,22 @@ def SendQC():
     skipSelSave = Forward()
     global MyQC
 
+    for opts in xy_opts:
+        if opts["cooldown"]:
+            cooldown = opts["cooldown"]
+            RawTrigger(
+                conditions=cooldown.AtLeast(1), actions=cooldown.SubtractNumber(1)
+            )
+    global useMouseLocation
+    if useMouseLocation:
+        _IsMouseMoved()
+    if useInputCheck:
+        _IsInputChanged()
+        if EUDIf()(isInputChanged == 0):  # No binding can be satisfied
+            DoActions(QGCActivated.SetNumber(0))
+            EUDReturn()
+        EUDEndIf()
+
     # 0x6284B8: (desync) *CUnits of units in selection (4 bytes * 12 units)
     for i in range(QCCount):  # skip if QCUnit is selected
         skipper, nextTrg = Forward(), Forward()
@@ -883,12 +1139,8 @@ def SendQC():
         actions=[
             SetNextPtr(skipper, nextTrg),
             QGCActivated.SetNumber(0),
-            cp.SetNumber(min(humans)),  # initialization for ReceiveQC
         ]
     )
-    global useMouseLocation
-    if useMouseLocation:
-        _IsMouseMoved()
 
     def parseCond(s):
         _ns = GetEUDNamespace()
@@ -901,17 +1153,28 @@ def SendQC():
                 s = re.sub(r"\b{}\b".format(k), "_ns['\g<0>']", s)
         return s
 
-    RC = Db(b"...\x14XXYY\0\0\xE4\0\x00")
-    SEL = Db(b"..\x09\x0112..")
+    # Select (4 bytes) followed by RightClick (10 bytes), queued at once.
+    # Both variable dwords are aligned: select count, unit id and RightClick
+    # opcode at QGC + 4 (unit id set by Respawn), waypoint at QGC + 8.
+    QGC = Db(b"...\x09\x01\0\0\x14XXYY\0\0\xE4\0\x00")
+
+    def QueueQC():
+        QueueGameCommand(QGC + 3, 14)
+
     f_setcurpl(f_getuserplayerid())
 
     _ns = GetEUDNamespace()
-    qc_list = eqsplit(qc_cons, len(bit_xy))
+    qc_list = eqsplit(qc_cons, len(bit_qc))
     qc_count = 0
+    if packedX:
+        qcValue = EUDVariable()
     for n, conds in enumerate(qc_list):
         qc_count += 1
-        DoActions(SetMemory(RC + 4, SetTo, 64 * 65537))
-        for con, bit in zip(conds, bit_xy):
+        if packedX:
+            DoActions(qcValue.SetNumber(0))
+        else:
+            DoActions(SetMemory(QGC + 8, SetTo, 64 * 65537))
+        for con, bit in zip(conds, bit_qc):
             if len(con) == 1:
                 if type(con[0]) is str:
                     condition = eval(parseCond(con[0]))
@@ -926,21 +1189,30 @@ def SendQC():
                         condition = condition(c)
                 condition = condition()
             if EUDIf()(condition):
-                DoActions(SetMemory(RC + 4, Add, bit))
+                if packedX:
+                    DoActions(qcValue.AddNumber(bit))
+                else:
+                    DoActions(SetMemory(QGC + 8, Add, bit))
             EUDEndIf()
-        if EUDIf()(Memory(RC + 4, AtLeast, 64 * 65537 + 1)):
-            DoActions(
-                [
-                    MyQCalphaids[n] << SetMemory(SEL + 4, SetTo, 0),
-                    QGCActivated.SetNumber(1),
-                ]
-            )
-            # TODO: Optimize QueueGameCommand and f_memcpy
-            QueueGameCommand(SEL + 2, 4)
-            QueueGameCommand(RC + 3, 10)  # RightClick
+        if packedX:
+            EUDIf()(qcValue >= 1)
+            y, x = f_div(qcValue, packedX)
+            f_dwwrite(QGC + 8, x + y * 65536 + 64 * 65537)
+        else:
+            EUDIf()(Memory(QGC + 8, AtLeast, 64 * 65537 + 1))
+        DoActions(
+            [
+                MyQCalphaids[n] << SetMemory(QGC + 4, SetTo, QGC_Select),
+                QGCActivated.SetNumber(1),
+            ]
+        )
+        QueueQC()
         EUDEndIf()
 
-    for n, (con, ret) in enumerate(zip(xy_cons, xy_rets)):
+    for n, (con, ret, opts) in enumerate(zip(xy_cons, xy_rets, xy_opts)):
+        cooldown, minDelta = opts["cooldown"], opts["minDelta"]
+        if cooldown:
+            con = con + [cooldown.Exactly(0)]
         if len(con) == 1:
             if type(con[0]) is str:
                 condition = eval(parseCond(con[0]))
@@ -954,14 +1226,24 @@ def SendQC():
                 else:
                     condition = condition(c)
             condition = condition()
+        if ret[0] == "val32":  # Continue transfer of the latched value
+            condition = EUDSCOr()(condition)(opts["transfer"].AtLeast(1))()
         EUDIf()(condition)
         if ret[0] == "mouse":
-            DoActions(SetMemory(RC + 4, SetTo, 64 * 65537))
+            DoActions(SetMemory(QGC + 8, SetTo, 64 * 65537))
             global cmpScreenX, cmpMouseX, cmpScreenY, cmpMouseY
             sX = f_mapXread_epd(EPD(0x62848C))
             sY, _csY = f_mapYread_epd(EPD(0x6284A8))
             mX = f_screenXread_epd(EPD(0x6CDDC4))
             mY, _cmY = f_screenYread_epd(EPD(0x6CDDC8))
+            if minDelta:
+                lastX, lastY = opts["last"]
+                x, y = sX + mX, _csY + _cmY
+                offset, limit = minDeltaBounds(minDelta)
+                dx, dy = x - lastX + offset, y - lastY + offset
+                EUDIf()(EUDSCOr()(dx >= limit)(dy >= limit)())
+                lastX << x
+                lastY << y
             addMouseCoord = Forward()
             VProc(
                 [sX, sY, mX, mY, _csY, _cmY],
@@ -972,20 +1254,20 @@ def SendQC():
                     mY.QueueAddTo(EPD(addMouseCoord) + 87),
                     _csY.QueueAssignTo(EPD(cmpScreenY) + 2),
                     _cmY.QueueAssignTo(EPD(cmpMouseY) + 2),
-                    MyQCalphaids[n + qc_count] << SetMemory(SEL + 4, SetTo, 0),
+                    MyQCalphaids[n + qc_count] << SetMemory(QGC + 4, SetTo, QGC_Select),
                     QGCActivated.SetNumber(1),
                 ],
             )
             addMouseCoord << VProc(
                 [sX, mX],
                 [
-                    SetMemory(RC + 4, Add, 0),
+                    SetMemory(QGC + 8, Add, 0),
                     sX.QueueAssignTo(EPD(cmpScreenX) + 2),
                     mX.QueueAssignTo(EPD(cmpMouseX) + 2),
                 ],
             )
-        elif ret[0] == "val":
-            DoActions(SetMemory(RC + 4, SetTo, 64 * 65537 + 1))
+        elif ret[0] == "val" or ret[0] == "val32":
+            DoActions(SetMemory(QGC + 8, SetTo, 64 * 65537 + 1))
 
             def parseSource(src, always=False):
                 if isinstance(src, int):
@@ -1002,17 +1284,24 @@ def SendQC():
                 return src
 
             src = parseSource(ret[1], always=True)
+            if ret[0] == "val32":
+                src = _Val32Payload(opts, src)
+            if minDelta:
+                last, value = opts["last"], f_maskread_epd(src, valMask)
+                offset, limit = minDeltaBounds(minDelta)
+                EUDIf()(value - last + offset >= limit)
+                last << value
             src = f_v2posread_epd(src)
             VProc(
                 src,
                 [
-                    src.QueueAddTo(EPD(RC) + 1),
-                    MyQCalphaids[n + qc_count] << SetMemory(SEL + 4, SetTo, 0),
+                    src.QueueAddTo(EPD(QGC) + 2),
+                    MyQCalphaids[n + qc_count] << SetMemory(QGC + 4, SetTo, QGC_Select),
                     QGCActivated.SetNumber(1),
                 ],
             )
         elif ret[0] == "xy":
-            DoActions(SetMemory(RC + 4, SetTo, 64 * 65537 + 1))
+            DoActions(SetMemory(QGC + 8, SetTo, 64 * 65537 + 1))
 
             def parseSource(src, always=False):
                 if isinstance(src, int):
@@ -1043,25 +1332,45 @@ def SendQC():
             VProc(
                 src,
                 [
-                    src.QueueAddTo(EPD(RC) + 1),
-                    MyQCalphaids[n + qc_count] << SetMemory(SEL + 4, SetTo, 0),
+                    src.QueueAddTo(EPD(QGC) + 2),
+                    MyQCalphaids[n + qc_count] << SetMemory(QGC + 4, SetTo, QGC_Select),
                     QGCActivated.SetNumber(1),
                 ],
             )
         else:
             raise EPError("{} is Unknown type for return value".format(ret[0]))
-        # TODO: Optimize QueueGameCommand and f_memcpy
-        QueueGameCommand(SEL + 2, 4)
-        QueueGameCommand(RC + 3, 10)  # RightClick
+        if cooldown:
+            DoActions(cooldown.SetNumber(opts["interval"]))
+        QueueQC()
+        if minDelta:
+            EUDEndIf()
         EUDEndIf()
 
 
+def DispatchBits(bitEPD, pairs, action, tested=False):
+    # Binary split on bit ranges: a half is visited only if any of its bits
+    # is set, so cost scales with set bits rather than number of bindings.
+    kind, arg = splitDispatch(pairs, tested)
+    if kind == "apply":
+        action(arg)
+    elif kind == "each":
+        for ret, bit in arg:
+            EUDIf()(MemoryXEPD(bitEPD, AtLeast, 1, bit))
+            action(ret)
+            EUDEndIf()
+    else:
+        for mask, half in arg:
+            EUDIf()(MemoryXEPD(bitEPD, AtLeast, 1, mask))
+            DispatchBits(bitEPD, half, action, True)
+            EUDEndIf()
+
+
 @EUDFunc
 def ReceiveQC():
     vi = EUDVariable()
-    DoActions([cp.SetNumber(min(humans)), vi.SetNumber(min(humans) * 18)])
 
     EUDHumanLoop()()
+    vi << cp * 18
     arrayPtr = ArrayPTRs[cp]
     arrayEPD = ArrayEPDs[cp]
     vr.seek(arrayPtr, arrayEPD, qc_epd)
@@ -1092,31 +1401,39 @@ def ReceiveQC():
     if init_array:
         DoActions(init_array)
 
-    qr_list = eqsplit(qc_rets, len(bit_xy))
+    def applyReturn(ret):
+        if ret[0] == "deaths":
+            DoActions(SetDeaths(CurrentPlayer, Add, ret[2], ret[1]))
+        elif ret[0] == "array":
+            _ns = GetEUDNamespace()
+            array = eval(parseArray(ret[1]))
+            if isUnproxyInstance(array, EUDArray):
+                f_dwadd_epd(EPD(array) + cp, ret[2])
+            elif isUnproxyInstance(array, EUDVArray(8)):
+                f_dwadd_epd((EPD(array) + 328 // 4 + 5) + vi, ret[2])
+            else:
+                raise EPError("{} unknown type for return value".format(ret[1]))
+
+    qr_list = eqsplit(qc_rets, len(bit_qc))
     for n, rets in enumerate(qr_list):
         vr.read()
+        _CheckQCUnitRemoved()
         waypoint = qc_epd + 0x10 // 4
         EUDIf()(MemoryEPD(waypoint, AtLeast, 64 * 65537 + 1))
         f_dwsubtract_epd(waypoint, 64 * 65537)
-        for ret, bit in zip(rets, bit_xy):
-            EUDIf()(MemoryXEPD(waypoint, AtLeast, 1, bit))
-            if ret[0] == "deaths":
-                DoActions(SetDeaths(CurrentPlayer, Add, ret[2], ret[1]))
-            elif ret[0] == "array":
-                array = eval(parseArray(ret[1]))
-                if isUnproxyInstance(array, EUDArray):
-                    f_dwadd_epd(EPD(array) + cp, ret[2])
-                elif isUnproxyInstance(array, EUDVArray(8)):
-                    f_dwadd_epd((EPD(array) + 328 // 4 + 5) + vi, ret[2])
-                else:
-                    raise EPError("{} unknown type for return value".format(ret[1]))
-            EUDEndIf()
+        if packedX:
+            x, y = f_posread_epd(waypoint)
+            qcValue = x + y * packedX
+            bitEPD = EPD(qcValue.getValueAddr())
+        else:
+            bitEPD = waypoint
+        DispatchBits(bitEPD, list(zip(rets, bit_qc)), applyReturn)
         f_dwwrite_epd(waypoint, 64 * 65537)
         EUDEndIf()
     vinit_array = []
     for rets in xy_rets:
         for ret in rets:
-            if ret == "xy" or ret == "mouse" or ret == "val":
+            if ret in ("xy", "mouse", "val", "val32"):
                 continue
             if type(ret) == str:
                 try:
@@ -1134,8 +1451,9 @@ def ReceiveQC():
     if vinit_array:
         DoActions(vinit_array)
 
-    for n, ret in enumerate(xy_rets):
+    for n, (ret, opts) in enumerate(zip(xy_rets, xy_opts)):
         vr.read()
+        _CheckQCUnitRemoved()
         waypoint = qc_epd + 0x10 // 4
         EUDIf()(MemoryEPD(waypoint, AtLeast, 64 * 65537 + 1))
         if ret[0] == "mouse":
@@ -1155,6 +1473,31 @@ def ReceiveQC():
                     f_dwwrite_epd((EPD(array) + 328 // 4 + 5) + vi, xy)
                 else:
                     raise EPError("{} unknown type for return value".format(ret[2]))
+        elif ret[0] == "val32":
+            f_dwsubtract_epd(waypoint, 64 * 65537 + 1)
+            xy = f_pos2vread_epd(waypoint)
+            chunkBits, seqBits = opts["chunkBits"], opts["seqBits"]
+            seq, chunk = xy & (2 ** seqBits - 1), f_bitrshift(xy, seqBits)
+            acc = EPD(opts["acc"]) + cp
+            for c in range(opts["chunks"]):
+                EUDIf()(seq == c)
+                if c == 0:
+                    f_dwwrite_epd(acc, chunk)
+                else:
+                    f_dwadd_epd(acc, chunk * 2 ** (chunkBits * c))
+                if c == opts["chunks"] - 1:  # Last chunk: value is complete
+                    value = f_dwread_epd(acc)
+                    if isinstance(ret[2], int):
+                        DoActions(SetDeaths(CurrentPlayer, SetTo, value, ret[2]))
+                    else:
+                        array = eval(parseArray(ret[2]))
+                        if isUnproxyInstance(array, EUDArray):
+                            f_dwwrite_epd(EPD(array) + cp, value)
+                        elif isUnproxyInstance(array, EUDVArray(8)):
+                            f_dwwrite_epd((EPD(array) + 328 // 4 + 5) + vi, value)
+                        else:
+                            raise EPError("%s unknown type for return value" % ret[2])
+                EUDEndIf()
         elif ret[0] == "xy":
             f_dwsubtract_epd(waypoint, 64 * 65537 + 1)
             if len(ret) == 3:
@@ -1199,8 +1542,6 @@ def ReceiveQC():
         f_dwwrite_epd(waypoint, 64 * 65537)
         EUDEndIf()
 
-    EUDSetContinuePoint()
-    DoActions([cp.AddNumber(1), vi.AddNumber(18)])
     EUDEndHumanLoop()
 
     KeyUpdate()
@@ -1209,6 +1550,8 @@ def ReceiveQC():
 
 def beforeTriggerExec():
     origcp = f_getcurpl()
+    if not useEventHooks:
+        UpdateHumanTable()
 
     if QCDebug:
         end = Forward()
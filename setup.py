@@ -20,7 +20,9 @@ build_exe_options = {
         "eudplib",
     ],
     "excludes": ["tkinter"],
-    "optimize": 2,
+    # Plugins validate settings with assert, and the precompiled bundle
+    # (edpkgutil/compileBundle.py) only has optimize=0 bytecode.
+    "optimize": 0,
     "include_msvcr": True,
     "include_files": [
         "freezeMpq.pyd",
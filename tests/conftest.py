@@ -0,0 +1,8 @@
+import os
+import sys
+
+# euddraft modules live at the repository root, and libraries for plugins
+# in lib/ (see euddraft.applylib)
+rootDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, rootDir)
+sys.path.append(os.path.join(rootDir, "lib"))
@@ -0,0 +1,181 @@
+import functools
+import json
+import os
+import socket
+import threading
+import time
+import zipfile
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import autoupdate
+from edpkgutil import manifest as mf
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """Local stand-in for the version and release servers"""
+    root = tmp_path / "www"
+    root.mkdir()
+    handler = functools.partial(QuietHandler, directory=str(root))
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    url = "http://127.0.0.1:%d/" % httpd.server_address[1]
+    monkeypatch.setattr(autoupdate, "VERSION_URL", url + "VERSION")
+    monkeypatch.setattr(autoupdate, "RELEASE_URL", url + "v%s/%s")
+    yield root
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def makeRelease(root, version, files, packages):
+    releaseDir = root / ("v%s" % version)
+    releaseDir.mkdir()
+    srcDir = root / "src"
+    srcDir.mkdir()
+    for path, data in files.items():
+        (srcDir / path).write_bytes(data)
+    manifest = {
+        "version": version,
+        "files": {path: mf.getFileDigest(srcDir / path) for path in files},
+        "packages": {},
+    }
+    for name, members in packages.items():
+        packagePath = str(releaseDir / name)
+        with zipfile.ZipFile(packagePath, "w") as zipf:
+            for path in members or files:
+                zipf.write(srcDir / path, path)
+        mf.addPackage(manifest, packagePath, members)
+    mf.saveManifest(
+        manifest, str(releaseDir / ("euddraft%s.manifest.json" % version))
+    )
+    return manifest
+
+
+def test_latest_version(server):
+    (server / "VERSION").write_text("0.9.9.9\n")
+    assert autoupdate.getLatestVersion() == "0.9.9.9"
+    (server / "VERSION").write_text("<html>not found</html>")
+    assert autoupdate.getLatestVersion() is None
+
+
+def test_version_check_times_out(monkeypatch):
+    # Accepts connections but never answers
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(1)
+    monkeypatch.setattr(
+        autoupdate, "VERSION_URL", "http://127.0.0.1:%d/" % sock.getsockname()[1]
+    )
+    monkeypatch.setattr(autoupdate, "UPDATE_TIMEOUT", 0.5)
+    startTime = time.time()
+    try:
+        assert autoupdate.getLatestVersion() is None
+    finally:
+        sock.close()
+    assert time.time() - startTime < 5
+
+
+def test_version_check_deadline(monkeypatch):
+    # Answers, but one byte at a time, so no single read times out
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(1)
+    stopped = threading.Event()
+
+    def trickle():
+        conn, _ = sock.accept()
+        conn.sendall(b"HTTP/1.0 200 OK\r\nContent-Length: 1000\r\n\r\n")
+        while not stopped.wait(0.1):
+            conn.sendall(b"0")
+        conn.close()
+
+    threading.Thread(target=trickle, daemon=True).start()
+    monkeypatch.setattr(
+        autoupdate, "VERSION_URL", "http://127.0.0.1:%d/" % sock.getsockname()[1]
+    )
+    startTime = time.time()
+    try:
+        assert autoupdate.getLatestVersionWithin(0.5) is None
+    finally:
+        stopped.set()
+        sock.close()
+    assert time.time() - startTime < 2
+
+
+def test_failed_check_is_recorded(tmp_path, monkeypatch):
+    from euddraft import version
+
+    monkeypatch.setattr(autoupdate.msgbox, "isWindows", True)
+    monkeypatch.setattr(
+        autoupdate.msgbox, "GetAsyncKeyState", lambda key: 0, raising=False
+    )
+    monkeypatch.setattr(autoupdate.sys, "frozen", True, raising=False)
+    monkeypatch.setattr(autoupdate.sys, "executable", str(tmp_path / "euddraft.exe"))
+    monkeypatch.setattr(autoupdate, "getLatestVersion", lambda: None)
+
+    autoupdate.checkUpdate()
+    checkpoint = (tmp_path / "vcheckpoint.dat").read_text()
+    checkedVersion, checkedTime = checkpoint.split()
+    assert checkedVersion == version
+    assert abs(int(checkedTime) - time.time()) < 10
+
+
+def test_delta_update_extracts_only_changed_files(server, tmp_path):
+    files = {"a.txt": b"unchanged", "b.txt": b"new contents"}
+    makeRelease(
+        server,
+        "1.0",
+        files,
+        {"euddraft1.0.zip": None, "euddraft1.0-delta.zip": ["b.txt"]},
+    )
+    dataDir = tmp_path / "install"
+    dataDir.mkdir()
+    (dataDir / "a.txt").write_bytes(b"unchanged")
+    (dataDir / "b.txt").write_bytes(b"old contents")
+    updateDir = str(dataDir / "_update")
+
+    assert autoupdate.downloadUpdate("1.0", str(dataDir), updateDir)
+    assert os.listdir(updateDir) == ["b.txt"]
+    assert (dataDir / "_update" / "b.txt").read_bytes() == b"new contents"
+    assert not (dataDir / "_update.part").exists()
+    assert not (dataDir / "_download").exists()
+
+
+def test_corrupt_package_is_rejected(server, tmp_path):
+    manifest = makeRelease(server, "1.0", {"a.txt": b"data"}, {"euddraft1.0.zip": None})
+    manifest["packages"]["euddraft1.0.zip"]["sha256"] = "0" * 64
+    releaseDir = server / "v1.0"
+    with open(releaseDir / "euddraft1.0.manifest.json", "w") as f:
+        json.dump(manifest, f)
+    dataDir = tmp_path / "install"
+    dataDir.mkdir()
+    updateDir = str(dataDir / "_update")
+
+    assert not autoupdate.downloadUpdate("1.0", str(dataDir), updateDir)
+    assert not os.path.exists(updateDir)
+
+
+def test_falls_back_to_full_package(server, tmp_path):
+    files = {"a.txt": b"new a", "b.txt": b"new b"}
+    makeRelease(server, "1.0", files, {"euddraft1.0-delta.zip": ["b.txt"]})
+    # Full package exists on the server but is not listed in the manifest
+    with zipfile.ZipFile(str(server / "v1.0" / "euddraft1.0.zip"), "w") as zipf:
+        for path, data in files.items():
+            zipf.writestr(path, data)
+    dataDir = tmp_path / "install"
+    dataDir.mkdir()
+    (dataDir / "a.txt").write_bytes(b"old a")
+    (dataDir / "b.txt").write_bytes(b"old b")
+    updateDir = str(dataDir / "_update")
+
+    assert autoupdate.downloadUpdate("1.0", str(dataDir), updateDir)
+    assert sorted(os.listdir(updateDir)) == ["a.txt", "b.txt"]
+    assert (dataDir / "_update" / "a.txt").read_bytes() == b"new a"
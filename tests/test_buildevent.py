@@ -0,0 +1,15 @@
+import buildevent
+
+
+def test_output_reaches_local_listeners_without_queue(tmp_path):
+    fname = tmp_path / "out.scx"
+    fname.write_bytes(b"map data")
+    events = []
+    buildevent.setEventQueue(None)
+    buildevent.addListener(events.append)
+    try:
+        buildevent.emitOutput(str(fname))
+    finally:
+        buildevent.removeListener(events.append)
+    assert [e["event"] for e in events] == ["output"]
+    assert events[0]["size"] == len(b"map data")
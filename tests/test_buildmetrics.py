@@ -0,0 +1,77 @@
+import json
+from urllib.request import urlopen
+
+from buildmetrics import BuildMetrics, startMetricsServer, summarizeBuild
+
+
+def makeEvents(success=True):
+    return [
+        {"event": "stageStarted", "stage": "loadMap", "time": 12.0},
+        {"event": "stageFinished", "stage": "loadMap", "duration": 0.5, "time": 12.5},
+        {"event": "pluginLoaded", "plugin": "MSQC", "duration": 0.25, "time": 12.6},
+        {
+            "event": "pluginTriggers",
+            "plugin": "MSQC",
+            "hook": "beforeTriggerExec",
+            "count": 40,
+            "time": 13.0,
+        },
+        {"event": "warning", "message": "w", "time": 13.1},
+        {"event": "output", "size": 1024, "sha256": "ab" * 32, "time": 13.2},
+        {"event": "finished", "success": success, "peakRSS": 4096, "time": 13.3},
+    ]
+
+
+def test_summarize_build():
+    build = summarizeBuild("a.edd", 10.0, makeEvents())
+    assert build["queueTime"] == 2.0
+    assert build["stages"] == {"loadMap": 0.5}
+    assert build["plugins"] == {"MSQC": 0.25}
+    assert build["triggers"] == {"MSQC": {"beforeTriggerExec": 40}}
+    assert build["warnings"] == 1
+    assert build["success"] is True
+    assert (build["outputSize"], build["peakRSS"]) == (1024, 4096)
+
+
+def test_prometheus_rendering():
+    metrics = BuildMetrics()
+    metrics.addBuild(summarizeBuild("a.edd", 10.0, makeEvents()))
+    metrics.addBuild(summarizeBuild('b"\\.edd', 10.0, makeEvents(success=False)))
+    text = metrics.toPrometheus()
+    lines = text.splitlines()
+
+    assert "# TYPE euddraft_builds_total counter" in lines
+    assert 'euddraft_builds_total{target="a.edd",result="success"} 1' in lines
+    assert 'euddraft_builds_total{target="b\\"\\\\.edd",result="failure"} 1' in lines
+    assert 'euddraft_build_queue_seconds_sum{target="a.edd"} 2.0' in lines
+    assert 'euddraft_build_queue_seconds_count{target="a.edd"} 1' in lines
+    assert (
+        'euddraft_build_stage_seconds_sum{target="a.edd",stage="loadMap"} 0.5' in lines
+    )
+    assert 'euddraft_last_output_bytes{target="a.edd"} 1024' in lines
+    assert 'euddraft_last_worker_peak_rss_bytes{target="a.edd"} 4096' in lines
+    assert text.endswith("\n")
+
+
+def test_history_is_bounded_json():
+    metrics = BuildMetrics(historySize=2)
+    for target in ("a.edd", "b.edd", "c.edd"):
+        metrics.addBuild(summarizeBuild(target, 10.0, makeEvents()))
+    history = json.loads(metrics.toJSON())
+    assert [build["target"] for build in history] == ["b.edd", "c.edd"]
+
+
+def test_metrics_server():
+    metrics = BuildMetrics()
+    metrics.addBuild(summarizeBuild("a.edd", 10.0, makeEvents()))
+    server = startMetricsServer(metrics, 0)
+    try:
+        url = "http://127.0.0.1:%d" % server.server_address[1]
+        with urlopen(url + "/metrics", timeout=5) as f:
+            assert f.headers["Content-Type"].startswith("text/plain")
+            assert b"euddraft_builds_total" in f.read()
+        with urlopen(url + "/history", timeout=5) as f:
+            assert json.loads(f.read())[0]["target"] == "a.edd"
+    finally:
+        server.shutdown()
+        server.server_close()
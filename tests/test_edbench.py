@@ -0,0 +1,169 @@
+import json
+import struct
+import sys
+
+import pytest
+
+from edbench import compare, configs, mapgen, suite
+
+
+def makeResults(stageTime, outputSize, success=True):
+    build = {
+        "success": success,
+        "stages": {"loadMap": 0.5, "saveMap": stageTime},
+        "plugins": {"MSQC": 0.2},
+        "outputSize": outputSize,
+        "triggers": {"MSQC": {"beforeTriggerExec": 100, "afterTriggerExec": 20}},
+    }
+    return {"meta": {}, "results": {"msqc-10": build}}
+
+
+def test_median_of_runs():
+    runs = [makeResults(t, 1000) for t in (1.0, 3.0, 2.0)]
+    metrics = compare.mergeRuns(runs)["results"]["msqc-10"]["metrics"]
+    assert metrics["stage:saveMap"] == [2.0, "time"]
+    assert metrics["buildTime"] == [2.5, "time"]
+    assert metrics["frameTriggers:MSQC"] == [120, "count"]
+
+
+def test_threshold():
+    baseline = makeResults(2.0, 1000)
+    assert compare.findRegressions(baseline, makeResults(2.1, 1090), 0.1) == []
+    regressions = compare.findRegressions(baseline, makeResults(2.0, 1200), 0.1)
+    assert regressions == [("msqc-10", "outputSize", 1000, 1200)]
+
+
+def test_small_time_difference_is_noise():
+    baseline = makeResults(0.1, 1000)
+    assert compare.findRegressions(baseline, makeResults(0.14, 1000), 0.1) == []
+    regressions = compare.findRegressions(baseline, makeResults(0.2, 1000), 0.1)
+    assert [r[1] for r in regressions] == ["buildTime", "stage:saveMap"]
+
+
+def test_failed_build_is_regression():
+    baseline = makeResults(2.0, 1000)
+    current = makeResults(2.0, 1000, success=False)
+    assert compare.findRegressions(baseline, current, 0.1) == [
+        ("msqc-10", "success", 1, 0)
+    ]
+
+
+def writeJSON(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f)
+    return str(path)
+
+
+def runMain(monkeypatch, *argv):
+    monkeypatch.setattr(sys, "argv", ["edbench.compare"] + list(argv))
+    try:
+        compare.main()
+    except SystemExit as e:
+        return e.code
+    return 0
+
+
+def test_exit_code(tmp_path, monkeypatch, capsys):
+    baseline = writeJSON(tmp_path / "base.json", makeResults(2.0, 1000))
+    same = writeJSON(tmp_path / "same.json", makeResults(2.0, 1000))
+    bigger = writeJSON(tmp_path / "bigger.json", makeResults(2.0, 1500))
+
+    assert runMain(monkeypatch, baseline, "--current", same) == 0
+    assert "No regression" in capsys.readouterr().out
+    assert runMain(monkeypatch, baseline, "--current", bigger) == 1
+    assert "REGRESSION msqc-10 outputSize: 1000 -> 1500" in capsys.readouterr().out
+    assert runMain(monkeypatch, baseline, "--current", bigger, "--threshold", "1") == 0
+
+
+@pytest.mark.parametrize("sizes", [(1000, 1500, 1000), (1500, 1000, 1000)])
+def test_median_hides_one_slow_run(tmp_path, monkeypatch, sizes):
+    baseline = writeJSON(tmp_path / "base.json", makeResults(2.0, 1000))
+    argv = [baseline]
+    for i, size in enumerate(sizes):
+        fname = writeJSON(tmp_path / ("%d.json" % i), makeResults(2.0, size))
+        argv += ["--current", fname]
+    assert runMain(monkeypatch, *argv) == 0
+
+
+def decrypt(data, key):
+    words = struct.unpack("<%dI" % (len(data) // 4), data)
+    seed = 0xEEEEEEEE
+    out = []
+    for word in words:
+        seed = (seed + mapgen._cryptTable[0x400 + (key & 0xFF)]) & 0xFFFFFFFF
+        word ^= (key + seed) & 0xFFFFFFFF
+        out.append(word)
+        key = ((((~key) << 0x15) + 0x11111111) & 0xFFFFFFFF) | (key >> 0x0B)
+        seed = (word + seed + (seed << 5) + 3) & 0xFFFFFFFF
+    return struct.pack("<%dI" % len(out), *out)
+
+
+def readMPQFile(data, name):
+    _, _, _, _, _, hashPos, blockPos, hashSize, blockSize = struct.unpack_from(
+        "<4s2I2H4I", data
+    )
+    hashKey = mapgen.hashString("(hash table)", mapgen.HASH_FILE_KEY)
+    blockKey = mapgen.hashString("(block table)", mapgen.HASH_FILE_KEY)
+    hashTable = decrypt(data[hashPos : hashPos + 16 * hashSize], hashKey)
+    blockTable = decrypt(data[blockPos : blockPos + 16 * blockSize], blockKey)
+    nameA = mapgen.hashString(name, mapgen.HASH_NAME_A)
+    nameB = mapgen.hashString(name, mapgen.HASH_NAME_B)
+    for i in range(hashSize):
+        a, b, _, _, blockIndex = struct.unpack_from("<2I2HI", hashTable, 16 * i)
+        if (a, b) == (nameA, nameB):
+            offset, size, _, _ = struct.unpack_from("<4I", blockTable, 16 * blockIndex)
+            return data[offset : offset + size]
+    raise KeyError(name)
+
+
+def readSections(chk):
+    sections, pos = {}, 0
+    while pos < len(chk):
+        name, size = struct.unpack_from("<4sI", chk, pos)
+        sections[name.decode("ascii").rstrip()] = chk[pos + 8 : pos + 8 + size]
+        pos += 8 + size
+    return sections
+
+
+def test_mpq_table_keys():
+    # Well known keys of MPQ hash and block tables
+    assert mapgen.hashString("(hash table)", mapgen.HASH_FILE_KEY) == 0xC3AF3770
+    assert mapgen.hashString("(block table)", mapgen.HASH_FILE_KEY) == 0xEC83B3A3
+
+
+def test_generated_map(tmp_path):
+    first, second = tmp_path / "1.scx", tmp_path / "2.scx"
+    mapgen.generateMap(str(first), 128, 96, 3, triggers=10)
+    mapgen.generateMap(str(second), 128, 96, 3, triggers=10)
+    data = first.read_bytes()
+    assert data == second.read_bytes()
+
+    sections = readSections(readMPQFile(data, "staredit\\scenario.chk"))
+    assert struct.unpack("<2H", sections["DIM"]) == (128, 96)
+    assert list(sections["OWNR"][:8]) == [6, 6, 6, 0, 0, 0, 0, 0]
+    assert len(sections["TRIG"]) == 10 * 2400
+    listfile = readMPQFile(data, "(listfile)")
+    assert listfile == b"staredit\\scenario.chk\r\n"
+
+
+def test_msqc_settings_are_distinct():
+    settings = configs.msqcSettings(100)
+    assert len(settings) == 100
+    assert all(key.startswith("KeyDown(") for key in settings)
+
+
+def test_prepare_case(tmp_path):
+    case = suite.getCase("msqc-10")
+    edsPath = suite.prepareCase(case, str(tmp_path))
+    with open(edsPath, encoding="utf-8") as f:
+        eds = f.read()
+    assert "[MSQC]" in eds
+    assert eds.count("KeyDown(") == 10
+    assert (tmp_path / "maps" / "medium.scx").exists()
+    names = [c["name"] for c in suite.getCases()]
+    assert len(names) == len(set(names))
+    assert [c["name"] for c in suite.selectCases(["chatEvent"])] == [
+        "chatEvent-10",
+        "chatEvent-1000",
+        "chatEvent-5000",
+    ]
@@ -0,0 +1,58 @@
+import os
+
+from eddaemon import BuildTarget, getAffectedTargets
+
+
+def writeEdd(path, inputMap, outputMap):
+    with open(path, "w") as f:
+        f.write("[main]\ninput: %s\noutput: %s\n" % (inputMap, outputMap))
+
+
+def loadTargets(tmp_path):
+    writeEdd(tmp_path / "a.edd", "in.scx", "a_out.scx")
+    writeEdd(tmp_path / "b.edd", "in.scx", "b_out.scx")
+    targets = [BuildTarget(tmp_path / "a.edd"), BuildTarget(tmp_path / "b.edd")]
+    for target in targets:
+        target.reload()
+    return targets
+
+
+def test_outputs_do_not_rebuild_targets_in_same_directory(tmp_path):
+    targets = loadTargets(tmp_path)
+    for name in ("a_out.scx", "b_out.scx"):
+        for ext in ("", ".epmap", ".epmap.prof"):
+            path = os.path.join(str(tmp_path), name + ext)
+            assert getAffectedTargets(targets, path) == []
+
+
+def test_sources_rebuild_every_target_in_directory(tmp_path):
+    targets = loadTargets(tmp_path)
+    path = os.path.join(str(tmp_path), "main.eps")
+    assert getAffectedTargets(targets, path) == targets
+    path = os.path.join(str(tmp_path), "in.scx")
+    assert getAffectedTargets(targets, path) == targets
+
+
+def test_global_plugin_files_rebuild_only_targets_importing_them(tmp_path):
+    pluginDir = tmp_path / "plugins"
+    pluginDir.mkdir()
+    (pluginDir / "main.py").write_text("import helper\nfrom pkg.sub import f\n")
+    (pluginDir / "helper.py").write_text("import deep as d, os\n")
+    (pluginDir / "deep.eps").write_text("import py_os;\n")
+    (pluginDir / "pkg").mkdir()
+    (pluginDir / "pkg" / "sub.py").write_text("")
+    (pluginDir / "unused.py").write_text("")
+    mapDir = tmp_path / "maps"
+    mapDir.mkdir()
+    with open(mapDir / "a.edd", "w") as f:
+        f.write("[main]\ninput: in.scx\noutput: out.scx\n[../plugins/main.py]\n")
+    writeEdd(mapDir / "b.edd", "in.scx", "b_out.scx")
+    targets = [BuildTarget(mapDir / "a.edd"), BuildTarget(mapDir / "b.edd")]
+    for target in targets:
+        target.reload()
+
+    for name in ("main.py", "helper.py", "deep.eps", os.path.join("pkg", "sub.py")):
+        path = os.path.join(str(pluginDir), name)
+        assert getAffectedTargets(targets, path) == targets[:1]
+    path = os.path.join(str(pluginDir), "unused.py")
+    assert getAffectedTargets(targets, path) == []
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+import epmapreport
+
+fixtures = os.path.join(os.path.dirname(__file__), "fixtures")
+mainPath = r"C:\maps\src\main.eps"
+
+
+def test_parse_epmap():
+    epmap = epmapreport.parseEpmap(os.path.join(fixtures, "main.scx.epmap"))
+    assert epmap == {
+        0: (mainPath, "onPluginStart", 2),
+        1: (mainPath, "beforeTriggerExec", 6),
+        2: (mainPath, "beforeTriggerExec", 7),
+    }
+
+
+def test_parse_profile():
+    profile = epmapreport.parseProfile(os.path.join(fixtures, "main.scx.epmap.prof"))
+    assert profile == {(mainPath, 2): 3, (mainPath, 6): 120, (mainPath, 7): 2400}
+
+
+def test_report_by_function():
+    profname = os.path.join(fixtures, "main.scx.epmap.prof")
+    functions, lines = epmapreport.loadProfile(profname)
+    assert functions == {
+        (mainPath, "onPluginStart"): 3,
+        (mainPath, "beforeTriggerExec"): 2520,
+    }
+    assert lines.most_common(1) == [((mainPath, 7, "beforeTriggerExec"), 2400)]
+
+
+def test_same_named_files_are_kept_apart(capsys):
+    epmap = {
+        0: (r"C:\maps\a\util.eps", "f", 1),
+        1: (r"C:\maps\b\util.eps", "f", 1),
+        2: (mainPath, "g", 1),
+    }
+    profile = {
+        (r"C:\maps\a\util.eps", 1): 10,
+        (r"C:\maps\b\util.eps", 1): 20,
+        (mainPath, 1): 5,
+    }
+    functions, lines = epmapreport.aggregate(profile, epmap)
+    assert functions[r"C:\maps\a\util.eps", "f"] == 10
+    assert functions[r"C:\maps\b\util.eps", "f"] == 20
+
+    epmapreport.printReport(functions, lines, 10)
+    out = capsys.readouterr().out
+    assert "f (a/util.eps)" in out
+    assert "f (b/util.eps)" in out
+    assert "g (main.eps)" in out
+
+
+@pytest.mark.parametrize(
+    "fname, content",
+    [
+        ("bad.epmap", "H0: 3f2a6c1e9b0d4875a1c3e5f708192a3b\nTotal: 3\n"),
+        ("bad.epmap", " - 1 : main.eps|f|1\n"),
+        ("bad.epmap.prof", "Sample got 10 / Failed 0\n"),
+        ("bad.epmap.prof", '[File "main.eps"]\n[ 12 ] foo();\n'),
+    ],
+)
+def test_unrecognized_lines_are_errors(tmp_path, fname, content):
+    path = tmp_path / fname
+    path.write_text(content)
+    if fname.endswith(".prof"):
+        parse = epmapreport.parseProfile
+    else:
+        parse = epmapreport.parseEpmap
+    with pytest.raises(RuntimeError, match=":[12]: Unrecognized line"):
+        parse(str(path))
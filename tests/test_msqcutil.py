@@ -0,0 +1,109 @@
+import itertools
+
+import pytest
+
+import msqcutil
+
+
+def test_key_offsets_by_dword():
+    # F1..F4 share a dword, Q is alone in another one
+    offsets = [0x71, 0x70, 0x72, 0x73, 0x51]
+    assert msqcutil.groupKeyOffsets(offsets) == {
+        0x70: [0x70, 0x71, 0x72, 0x73],
+        0x50: [0x51],
+    }
+    assert msqcutil.keyMask([0x70, 0x71, 0x72, 0x73]) == 0x01010101
+    assert msqcutil.keyMask([0x51]) == 0x100
+
+
+@pytest.mark.parametrize(
+    "cond, option",
+    [
+        ("Rate(12)", ("rate", 12)),
+        ("rate( 3 )", ("rate", 3)),
+        ("MinDelta(16)", ("minDelta", 16)),
+        ("KeyDown(A)", None),
+        ("Rate(-1)", None),
+        ("Rate()", None),
+    ],
+)
+def test_send_options(cond, option):
+    assert msqcutil.parseSendOption(cond) == option
+
+
+def test_send_interval():
+    assert msqcutil.sendInterval(0) == 0
+    assert msqcutil.sendInterval(24) == 1
+    assert msqcutil.sendInterval(12) == 2
+    assert msqcutil.sendInterval(5) == 5  # 24 / 5 rounded up
+    assert msqcutil.sendInterval(100) == 1
+
+
+@pytest.mark.parametrize("minDelta", [1, 2, 16])
+def test_min_delta_bounds(minDelta):
+    offset, limit = msqcutil.minDeltaBounds(minDelta)
+    for last, x in itertools.product([0, 5, 100, 0xFFFF], repeat=2):
+        moved = (x - last + offset) & 0xFFFFFFFF >= limit
+        assert moved == (abs(x - last) >= minDelta)
+
+
+@pytest.mark.parametrize("valBits", range(12, 33))
+def test_val32_layout(valBits):
+    seqBits, chunkBits, chunks = msqcutil.val32Layout(valBits)
+    assert seqBits + chunkBits == valBits
+    assert chunks <= 2 ** seqBits
+    assert (chunks - 1) * chunkBits < 32 <= chunks * chunkBits
+
+    # Send chunks the way SendQC does and reassemble them like ReceiveQC
+    value = 0xDEADBEEF
+    payloads = [
+        ((value >> (chunkBits * c)) & (2 ** chunkBits - 1)) * 2 ** seqBits + c
+        for c in range(chunks)
+    ]
+    assert all(p < 2 ** valBits for p in payloads)
+    acc = 0
+    for p in payloads:
+        seq, chunk = p & (2 ** seqBits - 1), p >> seqBits
+        acc += chunk << (chunkBits * seq)
+    assert acc & 0xFFFFFFFF == value
+
+
+def test_val32_layout_too_few_bits():
+    with pytest.raises(ValueError):
+        msqcutil.val32Layout(4)
+
+
+def dispatch(pairs, value, tested=False):
+    """Rets applied for bits of value, and number of bit tests made"""
+    kind, arg = msqcutil.splitDispatch(pairs, tested)
+    if kind == "apply":
+        return [arg], 0
+    if kind == "each":
+        return [ret for ret, bit in arg if value & bit], len(arg)
+    applied, tests = [], 0
+    for mask, half in arg:
+        tests += 1
+        if value & mask:
+            halfApplied, halfTests = dispatch(half, value, True)
+            applied += halfApplied
+            tests += halfTests
+    return applied, tests
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 7, 16, 31])
+def test_dispatch_bits(count):
+    pairs = [("ret%d" % i, 1 << i) for i in range(count)]
+    allBits = (1 << count) - 1
+    for value in [0, 1, 1 << (count - 1), allBits, 0x5555 & allBits]:
+        applied, _ = dispatch(pairs, value)
+        assert applied == [ret for ret, bit in pairs if value & bit]
+
+
+def test_dispatch_cost_follows_set_bits():
+    pairs = [("ret%d" % i, 1 << i) for i in range(32)]
+    _, noneSet = dispatch(pairs, 0)
+    _, oneSet = dispatch(pairs, 1 << 20)
+    _, allSet = dispatch(pairs, 0xFFFFFFFF)
+    assert noneSet == 2
+    assert oneSet < 16
+    assert oneSet < allSet
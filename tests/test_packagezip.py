@@ -0,0 +1,60 @@
+import os
+import zipfile
+
+import pytest
+
+from edpkgutil import packageZip as pz
+
+
+@pytest.fixture
+def buildDir(tmp_path):
+    root = tmp_path / "build"
+    (root / "lib").mkdir(parents=True)
+    (root / "euddraft.exe").write_bytes(b"MZ" + bytes(1000))
+    (root / "lib" / "plugin.py").write_text("print('hello')\n" * 50)
+    return root
+
+
+def test_reproducible(buildDir, tmp_path):
+    first, second = str(tmp_path / "1.zip"), str(tmp_path / "2.zip")
+    manifest = pz.packageZip(str(buildDir), first, "1.0")
+    os.utime(buildDir / "euddraft.exe", (0, 0))
+    pz.packageZip(str(buildDir), second, "1.0", jobs=1)
+    with open(first, "rb") as f1, open(second, "rb") as f2:
+        assert f1.read() == f2.read()
+
+    assert sorted(manifest["files"]) == ["euddraft.exe", "lib/plugin.py"]
+    with zipfile.ZipFile(first) as zipf:
+        assert zipf.testzip() is None
+        plugin = (buildDir / "lib" / "plugin.py").read_bytes()
+        assert zipf.read("lib/plugin.py") == plugin
+        assert zipf.read("VERSION") == b"1.0"
+        info = zipf.getinfo("euddraft.exe")
+        assert info.date_time == (1980, 1, 1, 0, 0, 0)
+        assert info.external_attr >> 16 == 0o100644
+
+
+def test_reuses_only_own_entries(buildDir, tmp_path, capsys):
+    previousZip = str(tmp_path / "prev.zip")
+    manifest = pz.packageZip(str(buildDir), previousZip, "1.0")
+    capsys.readouterr()
+
+    previous = (previousZip, manifest)
+    pz.packageZip(str(buildDir), str(tmp_path / "own.zip"), "1.1", previous=previous)
+    assert "Reused 2 of 2 entries" in capsys.readouterr().out
+
+    # Same files, written by the stdlib zip writer at another level
+    with zipfile.ZipFile(previousZip, "w", zipfile.ZIP_DEFLATED) as zipf:
+        for path in manifest["files"]:
+            zipf.write(buildDir / path, path)
+    otherZip = str(tmp_path / "other.zip")
+    pz.packageZip(str(buildDir), otherZip, "1.1", previous=previous)
+    assert "Reused" not in capsys.readouterr().out
+    with open(otherZip, "rb") as f1, open(tmp_path / "own.zip", "rb") as f2:
+        assert f1.read() == f2.read()
+
+
+def test_no_zip64(buildDir, tmp_path, monkeypatch):
+    monkeypatch.setattr(pz, "_maxSize", 500)
+    with pytest.raises(RuntimeError, match="euddraft.exe is too large"):
+        pz.packageZip(str(buildDir), str(tmp_path / "out.zip"), "1.0")
@@ -0,0 +1,115 @@
+import types
+import warnings
+
+import pytest
+
+import payloadstats
+
+
+class Ref:
+    """Constant reference to a trigger, like eudplib's ConstExpr"""
+
+    def __init__(self, baseobj, offset=0, rlocmode=payloadstats.RLOCMODE_ADDRESS):
+        self.baseobj = baseobj
+        self.offset = offset
+        self.rlocmode = rlocmode
+
+
+class Item:
+    def __init__(self, *fields):
+        self.fields = list(fields)
+
+
+class RawTrigger:
+    def __init__(self, nextptr=None, conditions=(), actions=()):
+        self._nextptr = nextptr
+        self._conditions = list(conditions)
+        self._actions = list(actions)
+
+
+@pytest.fixture
+def ep(monkeypatch):
+    monkeypatch.setattr(payloadstats, "_hookTriggers", [])
+    monkeypatch.setattr(payloadstats, "_allTriggers", [])
+
+    class Trigger(RawTrigger):
+        pass
+
+    return types.SimpleNamespace(RawTrigger=Trigger)
+
+
+def never():
+    return Item(0, 0, 0, 0, 0, payloadstats.NEVER_CONDTYPE)
+
+
+def test_dead_triggers(ep):
+    with payloadstats.installCounter(ep):
+        with payloadstats.countTriggers("plugin", "beforeTriggerExec"):
+            first = ep.RawTrigger()
+            second = ep.RawTrigger()
+            ep.RawTrigger()  # Nothing jumps here
+            guarded = ep.RawTrigger(conditions=[never()], actions=[Item(), Item()])
+            first._nextptr = Ref(second)
+            second._nextptr = Ref(guarded)
+    assert ep.RawTrigger.__init__ is RawTrigger.__init__
+
+    stats = payloadstats.findDeadTriggers()["plugin"]
+    assert stats["triggers"] == 4
+    assert stats["unreachable"] == 1
+    assert stats["neverRun"] == [guarded]
+    assert stats["wastedBytes"] == 2 * payloadstats.ACTION_SIZE
+
+
+def test_modified_never_trigger_is_kept(ep):
+    with payloadstats.installCounter(ep):
+        with payloadstats.countTriggers("plugin", "afterTriggerExec"):
+            first = ep.RawTrigger()
+            guarded = ep.RawTrigger(conditions=[never()], actions=[Item()])
+            # Writes into the condition of guarded, so it may run after all
+            first._nextptr = Ref(guarded)
+            first._actions.append(Item(Ref(guarded, offset=8 + 20)))
+
+    stats = payloadstats.findDeadTriggers()["plugin"]
+    assert stats["neverRun"] == []
+    assert stats["wastedBytes"] == 0
+
+
+def test_report_disabled_on_unknown_internals(ep):
+    with payloadstats.installCounter(ep):
+        with payloadstats.countTriggers("plugin", "beforeTriggerExec"):
+            trigger = ep.RawTrigger()
+    del trigger._actions
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        payloadstats.reportDeadTriggers()
+    assert len(caught) == 1
+    assert "disabled" in str(caught[0].message)
+
+
+def test_count_triggers_per_hook(ep):
+    events = []
+    payloadstats.buildevent.addListener(events.append)
+    try:
+        with payloadstats.installCounter(ep):
+            ep.RawTrigger()  # Outside of any hook
+            with payloadstats.countTriggers("outer", "onPluginStart"):
+                ep.RawTrigger()
+                with payloadstats.countTriggers("inner", "beforeTriggerExec"):
+                    ep.RawTrigger()
+                    ep.RawTrigger()
+    finally:
+        payloadstats.buildevent.removeListener(events.append)
+
+    counts = [
+        (e["plugin"], e["hook"], e["count"])
+        for e in events
+        if e["event"] == "pluginTriggers"
+    ]
+    # Triggers of a nested hook count for the outer hook too
+    assert counts == [("inner", "beforeTriggerExec", 2), ("outer", "onPluginStart", 3)]
+    hookTriggers = {
+        hook: len(triggers) for _, hook, triggers in payloadstats._hookTriggers
+    }
+    assert hookTriggers == {"beforeTriggerExec": 2, "onPluginStart": 1}
+    assert len(payloadstats._allTriggers) == 4